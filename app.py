@@ -1,5 +1,7 @@
 from flask import Flask, request, jsonify, render_template
-import backend.main_parser
+import youclidbackend.main_parser
+from youclidbackend.intersections import IntersectionCache
+import io
 import json
 import os
 
@@ -7,6 +9,8 @@ template_dir = os.path.abspath('./frontend')
 static_dir = os.path.abspath('./frontend')
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 name="postulate-1.json"
+# Shared by every compile, since the same figures keep being sent
+intersections = IntersectionCache(maxsize=10000)
 
 @app.route('/')
 def hello():
@@ -18,8 +22,18 @@ def view():
 
 @app.route('/parse', methods=['POST'])
 def parser():
-    data = request.stream.read().decode()
-    return json.dumps(backend.main_parser.parse(data.splitlines()))
+    data = io.TextIOWrapper(request.stream, encoding='utf-8')
+    context = youclidbackend.main_parser.Context(collect_errors=True,
+                                                 intersections=intersections)
+    try:
+        return json.dumps(youclidbackend.main_parser.parse(data, context))
+    except youclidbackend.main_parser.CompileError as e:
+        return jsonify(errors=[{'name': x.name, 'msg': x.msg,
+                                'lineno': x.lineno} for x in e.errors]), 400
+
+@app.route('/stats')
+def stats():
+    return jsonify(intersections=intersections.stats())
 
 if __name__ == '__main__':
     app.run(host="0.0.0.0")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Compare the markup scanner in tokenize() against the original shlex based
+tokenizer on the bundled texts, each of them repeated --scale times.
+
+    python3 benchmarks/bench_tokenize.py [--scale 1000] [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import youclidbackend  # noqa: E402
+from youclidbackend import main_parser  # noqa: E402
+
+
+def best_of(f, text, repeat):
+    """Return the fastest of repeat runs of f(text), and its result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f(text)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1000,
+                        help="How many times to repeat each text")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of timing runs, the best one is kept")
+    args = parser.parse_args()
+
+    texts = sorted(glob.glob(os.path.join(youclidbackend.__path__[0],
+                                          "data", "texts", "*.yc")))
+
+    print("%-24s %10s %12s %12s %8s" % ("file", "size", "shlex (s)",
+                                        "scanner (s)", "speedup"))
+    total_shlex = total_scan = 0
+    for path in texts:
+        with open(path) as f:
+            text = f.read() * args.scale
+
+        t_shlex, expected = best_of(main_parser._shlex_tokenize, text,
+                                    args.repeat)
+        t_scan, tokens = best_of(main_parser.tokenize, text, args.repeat)
+        tokens = [{'lineno': t['lineno'], 'data': t['data']} for t in tokens]
+        if tokens != expected:
+            sys.exit("Token mismatch for %s" % path)
+
+        total_shlex += t_shlex
+        total_scan += t_scan
+        print("%-24s %9.1fM %12.3f %12.3f %7.1fx" %
+              (os.path.basename(path), len(text) / 1e6, t_shlex, t_scan,
+               t_shlex / t_scan))
+
+    print("%-24s %10s %12.3f %12.3f %7.1fx" % ("total", "", total_shlex,
+                                               total_scan,
+                                               total_shlex / total_scan))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,9 @@ let darkurl = ""
 let lighturl = ""
 
 function init() {
+    if(geometry.packed) {
+	geometry = unpackGeometry(geometry)
+    }
     visual = new Visual()
     let renderer = new Renderer(geometry, visual)
     
@@ -29,6 +32,67 @@ function init() {
     renderer.render()
 }
 
+/*
+  Turn the typed arrays that payload.py packs the geometry into back into
+  the objects that the rest of this file uses
+*/
+const TYPES = ['Point', 'Line', 'Circle', 'Polygon', 'Angle']
+const NONE = 0xFFFFFFFF
+
+function decodeArray(Type, text) {
+    let bytes = Uint8Array.from(atob(text), (c) => c.charCodeAt(0))
+    return new Type(bytes.buffer)
+}
+
+function unpackGeometry(packed) {
+    let types = decodeArray(Uint8Array, packed.types)
+    let colors = decodeArray(Float32Array, packed.colors)
+    let coords = decodeArray(Float32Array, packed.coords)
+    let values = decodeArray(Float32Array, packed.values)
+    let offsets = decodeArray(Uint32Array, packed.offsets)
+    let refs = decodeArray(Uint32Array, packed.refs)
+
+    let number = (x) => isNaN(x) ? null : x
+    let ids = packed.names.map(
+	(name, i) => TYPES[types[i]].toLowerCase() + "_" + name)
+    let objects = {}
+    for(let i = 0; i < ids.length; i++) {
+	let points = Array.from(refs.subarray(offsets[i], offsets[i+1]),
+				(r) => r === NONE ? null : ids[r])
+	let value = number(values[i])
+	let data = null
+	switch(TYPES[types[i]]) {
+	case "Point":
+	    data = {x: number(coords[2*i]), y: number(coords[2*i+1])}
+	    break;
+	case "Line":
+	    data = {p1: points[0], p2: points[1]}
+	    break;
+	case "Circle":
+	    data = {p1: points[0], p2: points[1], p3: points[2],
+		    center: points[3], radius: value}
+	    break;
+	case "Polygon":
+	    data = {points: points}
+	    break;
+	case "Angle":
+	    data = {points: points, degree: value}
+	    break;
+	}
+	objects[ids[i]] = {
+	    type: TYPES[types[i]],
+	    id: ids[i],
+	    color: Array.from(colors.subarray(4*i, 4*i+4)),
+	    data: data,
+	    label: packed.names[i]
+	}
+    }
+    return {
+	geometry: objects,
+	animations: packed.animations.map((step) => step.map((i) => ids[i]))
+    }
+}
+
 function sortItems(toDraw, objs) {
     sorted = []
     // Gonna do 4 passes, first gets circles and polys,
@@ -458,7 +522,10 @@ function setStyleURLs() {
     let style = document.getElementById("stylesheet")
 
     darkurl = style.href
-    lighturl = darkurl.replace("default.css", "light.css")
+    // The page says where the light style is, since its name can have a
+    // hash in it
+    lighturl = style.dataset.light ? new URL(style.dataset.light, document.baseURI).href
+	: darkurl.replace("default.css", "light.css")
     console.log(darkurl)
     console.log(lighturl)
 }
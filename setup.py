@@ -6,6 +6,7 @@ setup(name='youclid',
       python_requires='>=3.6',
       packages=find_packages(),
       install_requires=['sympy'],
+      extras_require={'layout': ['numpy'], 'dist': ['brotli']},
       package_data={'youclidbackend': ['data/template.html',
                                        'data/styles/default.css',
                                        'data/styles/light.css',
@@ -2,3 +2,13 @@ from . import main_parser
 from . import tests
 from . import colors
 from . import utils
+from . import incremental
+from . import geometry
+from . import placement
+from . import layout
+from . import intersections
+from . import coordinates
+from . import payload
+from . import assets
+from . import distribution
+from . import manifest
@@ -0,0 +1,95 @@
+"""The styles and scripts that final pages refer to.
+
+They are published under names with the hash of their contents in them
+(like draw.3f2a1b9c04.js), so a server can tell browsers to keep them
+forever: a page that needs a different version refers to a different name.
+A directory that already has an asset under its hashed name doesn't get it
+again. Otherwise it is hard linked from a copy in a store that is shared by
+every directory that is published to (and copied if that isn't possible,
+like when the store is on another filesystem), so publishing the same
+assets to hundreds of directories hardly copies anything.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+# The assets, by their names in the data directory
+ASSETS = ["styles/default.css", "styles/light.css", "draw.js", "index.js"]
+
+_names = None
+
+
+def source(asset):
+    """Where the asset is in the package"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "data",
+                        asset)
+
+
+def default_store():
+    """Where the shared copies of the assets are kept unless told otherwise"""
+    base = os.environ.get("XDG_CACHE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "youclid", "assets")
+
+
+def names():
+    """The hashed name of each asset, which only changes when the asset
+    does. They are only worked out once."""
+    global _names
+    if _names is None:
+        hashed = {}
+        for asset in ASSETS:
+            with open(source(asset), 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:10]
+            base, ext = os.path.splitext(asset)
+            hashed[asset] = "%s.%s%s" % (base, digest, ext)
+        _names = hashed
+    return _names
+
+
+def publish(path, store=None):
+    """Put the assets in the directory at path under their hashed names,
+    unless they are there already. Returns names()."""
+    if store is None:
+        store = default_store()
+    for asset, name in names().items():
+        target = os.path.join(path, name)
+        if os.path.exists(target):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        stored = _stored(asset, os.path.join(store, name))
+        # The asset in the package is never linked to, since editing it
+        # would change the pages that were published with the old version
+        if stored is not None:
+            try:
+                os.link(stored, target)
+                continue
+            except OSError:
+                pass
+        _copy(stored or source(asset), target)
+    return names()
+
+
+def _stored(asset, stored):
+    """The path of the shared copy of the asset, which is made if it isn't
+    there. Returns None if it can't be."""
+    if not os.path.exists(stored):
+        try:
+            os.makedirs(os.path.dirname(stored), exist_ok=True)
+            _copy(source(asset), stored)
+        except OSError:
+            return None
+    return stored
+
+
+def _copy(src, dst):
+    # Copy it somewhere else first, so that no one ever sees half of it
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst), suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -31,7 +31,8 @@ DEFAULT = [AQUA, GREEN, BLUE, RED, ORANGE, PURPLE,
            LIME, MAROON, TEAL, FUCHSIA, OLIVE, GRAY]
 
 
-class _object_color():
+class Palette():
+    """Hands out the colors of the objects, one after another"""
     def __init__(self):
         self._counter = 0
         self._colors = DEFAULT
@@ -42,7 +43,7 @@ class _object_color():
         return r
 
 
-_o = _object_color()
+_o = Palette()
 
 
 def next_color():
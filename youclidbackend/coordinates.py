@@ -0,0 +1,45 @@
+"""The coordinates of all of the points in a document, in two arrays.
+
+Each point is given an index into the store of its context when it is made,
+and its x and y are read from and written to xs[index] and ys[index]. Points
+that haven't been placed yet are NaN there (and None as point.x and point.y).
+The arrays support the buffer protocol, so they can be handed to numpy or
+written out as they are, without going through the points one at a time.
+"""
+import array
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NAN = float('nan')
+
+
+class CoordinateStore():
+    """The x and y coordinates of a document's points"""
+    def __init__(self):
+        self.xs = array.array('d')
+        self.ys = array.array('d')
+
+    def __len__(self):
+        return len(self.xs)
+
+    def add(self):
+        """Make room for another point, which isn't placed yet. Returns its
+        index."""
+        self.xs.append(NAN)
+        self.ys.append(NAN)
+        return len(self.xs) - 1
+
+    def tolist(self):
+        """The coordinates as two lists, with None for the points that
+        haven't been placed"""
+        return ([None if math.isnan(x) else x for x in self.xs.tolist()],
+                [None if math.isnan(y) else y for y in self.ys.tolist()])
+
+    def numpy(self):
+        """A copy of the coordinates as a numpy array of (x, y) rows"""
+        return numpy.column_stack((numpy.frombuffer(self.xs),
+                                   numpy.frombuffer(self.ys)))
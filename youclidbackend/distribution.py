@@ -0,0 +1,185 @@
+"""Pages for readers on slow connections.
+
+    youclid text.yc -o text.html --dist
+
+writes the final page as a single file: the template, the geometry and the
+styles and scripts are all minified and put in it, so the page is one
+request instead of five. Compressed copies are written next to it
+(text.html.gz, and text.html.br if the brotli module is installed) for a
+static server to send as they are (like nginx does with gzip_static on),
+instead of compressing the page again for every reader.
+
+The minifiers only do what is safe for the code in this package: comments
+and indentation are removed and the spaces that don't separate anything are
+dropped, and line breaks in scripts are only dropped where they can't end a
+statement, since the scripts rely on them to.
+"""
+import gzip
+import io
+import os
+import re
+import urllib.parse
+
+from youclidbackend import assets
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Whitespace and comments, which are all the same to the minifier
+_GAP = re.compile(r'(?:\s|/\*.*?\*/|//[^\n]*)+', re.S)
+_STRING = re.compile(r'"(?:[^"\\\n]|\\.)*"|'
+                     r"'(?:[^'\\\n]|\\.)*'|"
+                     r'`(?:[^`\\]|\\.)*`', re.S)
+_REGEX = re.compile(r'/(?:[^/\\\n\[]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*')
+_WORD = re.compile(r'[\w$]+')
+# What can come right before a regular expression (anything else means that
+# a slash is division)
+_BEFORE_REGEX = set('(,=:[!&|?{};+-*%<>~^') | {'return', 'typeof'}
+
+# A line break can't end a statement after or before these, so it is just a
+# space there
+_CONTINUES = set('{([,;=:?&|')
+_CONTINUED = set(')]},.;:?')
+
+# The elements whose contents aren't HTML
+_RAW = re.compile(r'(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)',
+                  re.S | re.I)
+# What can be left as it is in the URL of an inlined stylesheet
+_URL_SAFE = "/:;{}(),.!*+=-_~"
+
+
+def minify_js(source):
+    """The script, without comments or the spaces that it doesn't need"""
+    out = []
+    gap = None
+    i = 0
+    while i < len(source):
+        match = _GAP.match(source, i)
+        if match:
+            gap = '\n' if '\n' in match.group() else ' '
+            i = match.end()
+            continue
+        match = (_STRING.match(source, i) or
+                 (source[i] == '/' and (not out or out[-1] in _BEFORE_REGEX)
+                  and _REGEX.match(source, i)) or
+                 _WORD.match(source, i))
+        token = match.group() if match else source[i]
+        if gap == '\n' and out and (out[-1][-1] in _CONTINUES or
+                                     token[0] in _CONTINUED):
+            gap = ' '
+        if gap == '\n' and out:
+            out.append('\n')
+        elif gap == ' ' and out and _separate(out[-1][-1], token[0]):
+            out.append(' ')
+        out.append(token)
+        gap = None
+        i += len(token)
+    return "".join(out)
+
+
+def _separate(before, after):
+    # Whether a space between the two characters is needed, to keep the
+    # tokens on either side of it from running together
+    if (before.isalnum() or before in '_$') and \
+            (after.isalnum() or after in '_$'):
+        return True
+    return (before in '+-' and after == before) or \
+        (before == '/' and after in '/*')
+
+
+def minify_css(source):
+    """The stylesheet, without comments or the spaces that it doesn't
+    need. Spaces in strings aren't kept, which is fine for ours."""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r' ?([{};,]) ?', r'\1', source)
+    source = source.replace(': ', ':').replace(';}', '}')
+    return source.strip()
+
+
+def minify_html(source):
+    """The page without comments or indentation, with its inline scripts
+    and styles minified as well"""
+    out = []
+    end = 0
+    for match in _RAW.finditer(source):
+        out.append(_minify_text(source[end:match.start()]))
+        start, tag, content, close = match.groups()
+        if tag.lower() == 'script':
+            content = minify_js(content)
+        elif tag.lower() == 'style':
+            content = minify_css(content)
+        out.append(start + content + close)
+        end = match.end()
+    out.append(_minify_text(source[end:]))
+    return "".join(out).strip()
+
+
+def _minify_text(html):
+    html = re.sub(r'<!--.*?-->', '', html, flags=re.S)
+    return re.sub(r'[ \t\r]*\n\s*', '\n', html)
+
+
+def inline(html):
+    """Put the styles and scripts that a final page refers to into it,
+    minified. The stylesheets become data URLs, so that the theme switch can
+    still change between them."""
+    for asset, name in assets.names().items():
+        with open(assets.source(asset)) as f:
+            content = f.read()
+        if asset.endswith('.css'):
+            url = "data:text/css," + urllib.parse.quote(minify_css(content),
+                                                         safe=_URL_SAFE)
+            html = html.replace('"%s"' % name, '"%s"' % url)
+        else:
+            # The script ends at the first </script, wherever it is
+            content = minify_js(content).replace("</script", "<\\/script")
+            html = html.replace('<script src="%s"></script>' % name,
+                                '<script>%s</script>' % content)
+    return html
+
+
+def compress(data):
+    """The compressed copies of data, by their extensions"""
+    out = io.BytesIO()
+    # Without a time in it, the same page always compresses to the same file
+    with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=9,
+                       mtime=0) as f:
+        f.write(data)
+    copies = {'.gz': out.getvalue()}
+    if brotli is not None:
+        copies['.br'] = brotli.compress(data)
+    return copies
+
+
+def unbundled_size(html):
+    """The bytes that a reader downloads for a final page, html, along with
+    the styles and scripts that it refers to"""
+    return len(html.encode('utf-8')) + sum(
+        os.path.getsize(assets.source(asset)) for asset in assets.ASSETS)
+
+
+def write(html, path):
+    """Write the final page, html, to path as a single minified file, along
+    with its compressed copies. Returns the path and size of every file that
+    was written."""
+    data = inline(minify_html(html)).encode('utf-8')
+    written = []
+    for extension, content in [('', data)] + sorted(compress(data).items()):
+        with open(path + extension, 'wb') as f:
+            f.write(content)
+        written.append((path + extension, len(content)))
+    return written
+
+
+def report(before, written):
+    """The sizes that write() returned, next to the size of the page that
+    it replaces, as lines to print"""
+    lines = ["%-40s %9d bytes" % ("before (page, styles and scripts)",
+                                  before)]
+    for path, size in written:
+        lines.append("%-40s %9d bytes %5.1f%%" %
+                     (path, size, 100.0 * size / before))
+    return lines
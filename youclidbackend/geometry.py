@@ -0,0 +1,174 @@
+"""Intersections of segments, circles and polygons with plain floats.
+
+This is what constrain() uses to place points, unless it is asked to be
+exact, in which case sympy is used instead. sympy turns the coordinates into
+rationals and solves the equations symbolically, which is a lot slower than
+the closed form solutions here.
+
+Points are (x, y) tuples. Two things are taken to touch (or a point to be on
+something) when they are within EPSILON of each other.
+"""
+import collections
+import math
+
+EPSILON = 1e-9
+
+Segment = collections.namedtuple('Segment', 'p1 p2')
+Circle = collections.namedtuple('Circle', 'center radius')
+Polygon = collections.namedtuple('Polygon', 'points')
+
+
+def intersection(*entities):
+    """The points that are on all of the entities, sorted. Where two entities
+    overlap along a segment or an arc, none of the overlap is included."""
+    if len(entities) < 2:
+        return []
+    points = _intersect(entities[0], entities[1])
+    for entity in entities[2:]:
+        points = [p for p in points if contains(entity, p)]
+    return sorted(_unique(points))
+
+
+def contains(entity, point):
+    """Whether the point is on the entity"""
+    if isinstance(entity, Segment):
+        return _segment_distance(entity, point) <= EPSILON
+    elif isinstance(entity, Circle):
+        return abs(_dist(entity.center, point) - entity.radius) <= EPSILON
+    elif isinstance(entity, Polygon):
+        return any(contains(e, point) for e in edges(entity))
+    raise TypeError("Can't intersect %s" % type(entity).__name__)
+
+
+def edges(polygon):
+    """The sides of the polygon, as segments"""
+    points = polygon.points
+    return [Segment(points[i - 1], points[i]) for i in range(len(points))]
+
+
+def _intersect(a, b):
+    if isinstance(a, Polygon):
+        return [p for e in edges(a) for p in _intersect(e, b)]
+    elif isinstance(b, Polygon):
+        return [p for e in edges(b) for p in _intersect(a, e)]
+    elif isinstance(a, Segment) and isinstance(b, Segment):
+        return segment_segment(a, b)
+    elif isinstance(a, Segment) and isinstance(b, Circle):
+        return segment_circle(a, b)
+    elif isinstance(a, Circle) and isinstance(b, Segment):
+        return segment_circle(b, a)
+    elif isinstance(a, Circle) and isinstance(b, Circle):
+        return circle_circle(a, b)
+    raise TypeError("Can't intersect %s and %s" % (type(a).__name__,
+                                                   type(b).__name__))
+
+
+def segment_segment(a, b):
+    (px, py), (qx, qy) = a.p1, b.p1
+    rx, ry = a.p2[0] - px, a.p2[1] - py
+    sx, sy = b.p2[0] - qx, b.p2[1] - qy
+    r_len, s_len = math.hypot(rx, ry), math.hypot(sx, sy)
+    if r_len <= EPSILON or s_len <= EPSILON:
+        # At least one of them is a point
+        if r_len <= EPSILON:
+            return [a.p1] if contains(b, a.p1) else []
+        return [b.p1] if contains(a, b.p1) else []
+
+    denom = rx * sy - ry * sx
+    if abs(denom) <= EPSILON * r_len * s_len:
+        # Parallel. If they are on the same line and only share an end, that
+        # is where they meet.
+        if _line_distance(a, b.p1) > EPSILON:
+            return []
+        ends = [p for p in (a.p1, a.p2) if contains(b, p)] + \
+               [p for p in (b.p1, b.p2) if contains(a, p)]
+        ends = _unique(ends)
+        return ends if len(ends) == 1 else []
+
+    t = ((qx - px) * sy - (qy - py) * sx) / denom
+    u = ((qx - px) * ry - (qy - py) * rx) / denom
+    # Tolerances in terms of the distance along each segment
+    if (-EPSILON / r_len <= t <= 1 + EPSILON / r_len and
+            -EPSILON / s_len <= u <= 1 + EPSILON / s_len):
+        return [(px + t * rx, py + t * ry)]
+    return []
+
+
+def segment_circle(segment, circle):
+    (x1, y1), (cx, cy) = segment.p1, circle.center
+    dx, dy = segment.p2[0] - x1, segment.p2[1] - y1
+    length_squared = dx * dx + dy * dy
+    if length_squared <= EPSILON * EPSILON:
+        return [segment.p1] if contains(circle, segment.p1) else []
+    length = math.sqrt(length_squared)
+
+    # The closest point to the center on the line through the segment
+    t = ((cx - x1) * dx + (cy - y1) * dy) / length_squared
+    foot = (x1 + t * dx, y1 + t * dy)
+    distance = _dist(foot, circle.center)
+    if distance > circle.radius + EPSILON:
+        return []
+    if abs(distance - circle.radius) <= EPSILON:
+        # Tangent
+        candidates = [(t, foot)]
+    else:
+        half = math.sqrt(circle.radius ** 2 - distance ** 2) / length
+        candidates = [(t - half, (x1 + (t - half) * dx, y1 + (t - half) * dy)),
+                      (t + half, (x1 + (t + half) * dx, y1 + (t + half) * dy))]
+    pad = EPSILON / length
+    return [p for t, p in candidates if -pad <= t <= 1 + pad]
+
+
+def circle_circle(a, b):
+    d = _dist(a.center, b.center)
+    if d <= EPSILON:
+        # Concentric circles either don't meet or are the same circle
+        return []
+    if d > a.radius + b.radius + EPSILON or \
+            d < abs(a.radius - b.radius) - EPSILON:
+        return []
+
+    ux = (b.center[0] - a.center[0]) / d
+    uy = (b.center[1] - a.center[1]) / d
+    # How far along the line between the centers the chord between the two
+    # intersections is, and half of its length
+    along = (a.radius ** 2 - b.radius ** 2 + d * d) / (2 * d)
+    h_squared = a.radius ** 2 - along ** 2
+    mx, my = a.center[0] + along * ux, a.center[1] + along * uy
+    if abs(d - (a.radius + b.radius)) <= EPSILON or \
+            abs(d - abs(a.radius - b.radius)) <= EPSILON or h_squared <= 0:
+        # Tangent
+        return [(mx, my)]
+    h = math.sqrt(h_squared)
+    return [(mx - h * uy, my + h * ux), (mx + h * uy, my - h * ux)]
+
+
+def _dist(p, q):
+    return math.hypot(p[0] - q[0], p[1] - q[1])
+
+
+def _line_distance(segment, point):
+    """Distance from the point to the line through the segment"""
+    (x1, y1), (x2, y2) = segment
+    return abs((x2 - x1) * (y1 - point[1]) - (x1 - point[0]) * (y2 - y1)) / \
+        math.hypot(x2 - x1, y2 - y1)
+
+
+def _segment_distance(segment, point):
+    (x1, y1), (x2, y2) = segment
+    dx, dy = x2 - x1, y2 - y1
+    length_squared = dx * dx + dy * dy
+    if length_squared == 0:
+        return _dist(segment.p1, point)
+    t = ((point[0] - x1) * dx + (point[1] - y1) * dy) / length_squared
+    t = max(0, min(1, t))
+    return _dist((x1 + t * dx, y1 + t * dy), point)
+
+
+def _unique(points):
+    """The points, without any that are the same as an earlier one"""
+    ret = []
+    for p in points:
+        if all(_dist(p, q) > EPSILON for q in ret):
+            ret.append(p)
+    return ret
@@ -0,0 +1,217 @@
+"""Recompiling a document after an edit, without starting from scratch.
+
+    document = incremental.compile_document(text)
+    document = incremental.reparse(document, start, end, "replacement")
+    document = incremental.update(document, new_text)
+    document.output  # the same thing that main_parser.parse() returns
+
+Offsets are indices into the text of the document, and an edit replaces
+text[start:end] with the replacement. Only the markup around the edit is
+tokenized again. If the markup didn't change, the geometry of the previous
+compile is reused as it is, and only the HTML text is put together again.
+
+If the markup did change, the rest of the compile isn't incremental: every
+declaration is declared again in a fresh context, so the objects, the steps
+and the HTML text are all rebuilt, and constrain() runs over the whole
+figure. What is saved is the solving: the points whose definitions didn't
+change keep their coordinates, so only the points in the changed part of
+the figure are placed again. Declaring just the changed declarations would
+mean taking their objects back out of the ones that refer to them, which
+the primitives don't support.
+"""
+import bisect
+
+from youclidbackend import main_parser, placement
+
+
+class Document():
+    """A compiled document, and what is needed to recompile it after an edit"""
+    def __init__(self, text, groups, output, context, definitions):
+        self.text = text
+        # The tokens of every top level markup declaration, in order
+        self.groups = groups
+        # The offset of the end of each declaration, for bisecting
+        self.ends = [g[-1]['end'] for g in groups]
+        # What main_parser.parse() would return for the text
+        self.output = output
+        # The context of the compile, with the objects and their coordinates
+        self.context = context
+        # What each point was defined by, before it was placed
+        self.definitions = definitions
+
+
+def compile_document(text, context=None):
+    """Compile the text, keeping what is needed for reparse(). Later compiles
+    of the document use contexts with the same options as this one."""
+    if context is None:
+        context = main_parser.Context()
+    groups = list(_groups(context, main_parser._scan(text)))
+    return _compile(text, groups, context)
+
+
+def reparse(document, start, end, replacement):
+    """Returns the document after replacing document.text[start:end] with the
+    replacement"""
+    old_text = document.text
+    text = old_text[:start] + replacement + old_text[end:]
+    delta = len(replacement) - (end - start)
+    line_delta = replacement.count('\n') - old_text.count('\n', start, end)
+    groups = document.groups
+
+    # The first declaration that the edit can change is the first one that
+    # ends at or after the start of the edit (text right after a "]" can
+    # still be part of the same token, like "]]"). We start scanning again
+    # just after
+    # the declaration before it, where we know that we are in prose.
+    first = bisect.bisect_left(document.ends, start)
+    if first:
+        previous = groups[first - 1][-1]
+        offset = previous['end']
+        lineno = previous['lineno'] + old_text.count('\n', previous['start'],
+                                                     offset)
+    else:
+        offset = 0
+        lineno = 1
+
+    # Scan until we find a declaration after the edit that starts exactly
+    # where one of the old ones did; everything after that is unchanged
+    new_groups = []
+    last = len(groups)
+    context = document.context.fresh()
+    scan = main_parser._scan(text, start=offset, lineno=lineno)
+    for piece in _groups(context, scan):
+        new_start = piece[-1]['start']
+        if new_start > end + delta:
+            i = bisect.bisect_right(document.ends, new_start - delta)
+            if (i < len(groups) and i >= first and
+                    groups[i][-1]['start'] == new_start - delta and
+                    groups[i][-1]['start'] > end):
+                last = i
+                break
+        new_groups.append(piece)
+
+    tail = groups[last:]
+    if delta or line_delta:
+        tail = [[_shift(t, delta, line_delta) for t in g] for g in tail]
+    groups = groups[:first] + new_groups + tail
+
+    # If no markup changed, neither did the geometry
+    if not context.errors and \
+            ([[t['data'] for t in g] for g in new_groups] ==
+             [[t['data'] for t in g] for g in document.groups[first:last]]):
+        output = dict(document.output)
+        output['text'] = _format(text, groups)
+        return Document(text, groups, output, document.context,
+                        document.definitions)
+
+    return _compile(text, groups, context, document)
+
+
+def update(document, text):
+    """Returns the document with its text replaced by the new text, treating
+    everything between the common beginning and end of the two as edited"""
+    start, end, replacement = diff(document.text, text)
+    return reparse(document, start, end, replacement)
+
+
+def diff(old, new):
+    """Returns (start, end, replacement) such that replacing old[start:end]
+    with the replacement gives new"""
+    # Compare blocks at a time first, since that is done in C
+    block = 4096
+    length = min(len(old), len(new))
+    start = 0
+    while start + block <= length and \
+            old[start:start + block] == new[start:start + block]:
+        start += block
+    while start < length and old[start] == new[start]:
+        start += 1
+
+    # The common end must not overlap with the common beginning
+    length -= start
+    end = 0
+    while end + block <= length and \
+            old[len(old) - end - block:len(old) - end] == \
+            new[len(new) - end - block:len(new) - end]:
+        end += block
+    while end < length and old[len(old) - end - 1] == new[len(new) - end - 1]:
+        end += 1
+    return start, len(old) - end, new[start:len(new) - end]
+
+
+def _shift(token, delta, line_delta):
+    token = dict(token)
+    token['start'] += delta
+    token['end'] += delta
+    token['lineno'] += line_delta
+    return token
+
+
+def _format(text, groups):
+    """Put the HTML text together from the declarations and the prose in
+    between them"""
+    formatter = main_parser._TextFormatter()
+    pos = 0
+    for g in groups:
+        formatter.add_text(text[pos:g[-1]['start']])
+        formatter.add_markup(g[-1])
+        pos = g[-1]['end']
+    formatter.add_text(text[pos:])
+    return formatter.result()
+
+
+def _groups(context, scan):
+    """The declarations from the scanner, without the prose in between"""
+    try:
+        for piece in scan:
+            if not isinstance(piece, str):
+                yield piece
+    except main_parser.CompileError as e:
+        # Nothing after an error in the markup can be read
+        context.report(e)
+
+
+def _compile(text, groups, context, previous=None):
+    """Compile all of the declarations in the context. If there is a
+    previous document, points that are defined the same way as they were in
+    it keep their coordinates, so the solver only places the others."""
+    animations, angles = main_parser.declare(context,
+                                             (t for g in groups for t in g))
+    obj_dict = context.obj_dict
+    definitions = {name: placement.point_definition(p)
+                   for name, p in obj_dict['point'].items()}
+
+    if previous is None:
+        main_parser.place(context)
+    else:
+        for name in _unchanged_points(definitions, previous):
+            point = obj_dict['point'][name]
+            old = previous.context.obj_dict['point'][name]
+            point.x, point.y = old.x, old.y
+        main_parser.constrain(context)
+    for angle, lineno in angles:
+        main_parser.parse_angle(context, angle, lineno=lineno)
+    output = main_parser.create_output(context, _format(text, groups),
+                                       animations)
+    return Document(text, groups, output, context, definitions)
+
+
+def _unchanged_points(definitions, previous):
+    """Names of the points that are defined just like in the previous compile
+    and only depend on points for which the same is true, or which have been
+    given the same location as before"""
+    old_points = previous.context.obj_dict['point']
+    located = {name for name, d in definitions.items()
+               if name in old_points and d[0][1] is not None and
+               (d[0][1], d[0][2]) == (old_points[name].x, old_points[name].y)}
+    unchanged = {name for name, d in definitions.items()
+                 if previous.definitions.get(name) == d and
+                 old_points[name].x is not None} - located
+    changed = True
+    while changed:
+        changed = False
+        for name in list(unchanged):
+            if not definitions[name][1] <= unchanged | located:
+                unchanged.remove(name)
+                changed = True
+    return unchanged
@@ -0,0 +1,75 @@
+"""A cache of intersections that outlives a single compile.
+
+A server that compiles documents keeps seeing the same constructions: the
+same circles through the same points, at the same loc values. Contexts that
+are given the same IntersectionCache look the intersections of those up
+instead of working them out again:
+
+    intersections = IntersectionCache(maxsize=10000)
+    context = main_parser.Context(intersections=intersections)
+
+Shapes are looked up by their types and the numbers that define them,
+rounded to the cache's tolerance, so shapes that are closer together than
+that share their intersections. The cache holds at most maxsize of them,
+and forgets the ones that were used least recently first.
+"""
+import collections
+import threading
+
+from youclidbackend import geometry
+
+
+class IntersectionCache():
+    """A bounded LRU cache of intersections, which can be used by many
+    threads at once"""
+    def __init__(self, maxsize=4096, tolerance=geometry.EPSILON):
+        self.maxsize = maxsize
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, exact, shapes):
+        """The key for the intersection of the shapes (from numify()), for
+        a context that is exact or not"""
+        return (exact,) + tuple((type(s).__name__,) + self._round(s)
+                                for s in shapes)
+
+    def _round(self, value):
+        if isinstance(value, (tuple, list)):
+            return tuple(n for v in value for n in self._round(v))
+        return (round(value / self.tolerance),)
+
+    def get(self, key):
+        """The intersection for the key, or None if it isn't cached"""
+        with self._lock:
+            points = self._entries.get(key)
+            if points is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return points
+
+    def put(self, key, points):
+        with self._lock:
+            self._entries[key] = points
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """The counters, to see whether maxsize is big enough"""
+        with self._lock:
+            return {'size': len(self._entries),
+                    'maxsize': self.maxsize,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions}
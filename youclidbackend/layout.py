@@ -0,0 +1,81 @@
+"""Scoring many random layouts of a figure at once, to keep the best one.
+
+The points that can go anywhere are drawn for all of the layouts at once by
+sample(), and once the solver has placed everything else, score() rates every
+layout in one go: how close the closest two points are, how close any point
+is to the edge of the figure, and how much the labels of the points cover
+each other and the points. The layout with the highest score is the one that
+is used.
+
+This needs numpy, which is only imported when it is there, so that the rest
+of the package works without it.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Where the frontend puts the label of a point (see makeLabels() in index.js),
+# as the offset from the point to the middle of the label, and the size of
+# the label, roughly, in the coordinates of the figure
+LABEL_OFFSET = (0.054, 0.02)
+LABEL_SIZE = (0.06, 0.08)
+# How much a label that is completely covered costs, in terms of distance
+# between points
+LABEL_PENALTY = 0.1
+
+
+def generator(seed):
+    """A numpy random number generator"""
+    return numpy.random.default_rng(seed)
+
+
+def sample(rng, candidates, n):
+    """Coordinates anywhere in the figure for n points, in each of the
+    candidate layouts, as an array of shape (candidates, n, 2)"""
+    return rng.uniform(-1, 1, size=(candidates, n, 2))
+
+
+def score(coords, moving):
+    """How well spread out each layout is, higher being better. coords is an
+    array of shape (layouts, points, 2), and moving says which of the points
+    are in different places in different layouts; points that are in the
+    same place in all of them only count when they are near one that isn't,
+    so that they don't make all of the layouts look as bad as each other."""
+    coords = numpy.asarray(coords, dtype=float)
+    moving = numpy.asarray(moving, dtype=bool)
+    layouts, n = coords.shape[:2]
+    if not moving.any():
+        return numpy.zeros(layouts)
+    # The pairs of different points where at least one of them moves
+    pairs = (moving[:, None] | moving[None, :]) & ~numpy.eye(n, dtype=bool)
+
+    delta = coords[:, :, None, :] - coords[:, None, :, :]
+    distance = numpy.hypot(delta[..., 0], delta[..., 1])
+    separation = numpy.where(pairs, distance, numpy.inf).min(axis=(1, 2))
+
+    # Negative for points that are outside of the figure
+    margin = (1 - numpy.abs(coords[:, moving]).max(axis=2)).min(axis=1)
+
+    # The labels are about the same size, so two of them overlap by as much
+    # as the boxes around their middles do. A point that a label covers is
+    # counted like another label that is on top of the point.
+    labels = coords + LABEL_OFFSET
+    width, height = LABEL_SIZE
+    overlap = _overlap(labels[:, :, None, :] - labels[:, None, :, :],
+                       width, height)
+    covered = _overlap(labels[:, :, None, :] - coords[:, None, :, :],
+                       width, height)
+    # Each pair of labels is in both halves of the matrix
+    overlap = numpy.where(pairs, overlap / 2 + covered, 0).sum(axis=(1, 2))
+
+    return numpy.minimum(separation, margin) - \
+        LABEL_PENALTY * overlap / (width * height)
+
+
+def _overlap(delta, width, height):
+    """The area that two boxes of the same size overlap by, given how far
+    apart their middles are"""
+    dx = numpy.clip(width - numpy.abs(delta[..., 0]), 0, None)
+    dy = numpy.clip(height - numpy.abs(delta[..., 1]), 0, None)
+    return dx * dy
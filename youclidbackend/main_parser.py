@@ -2,51 +2,237 @@
 import sympy
 import argparse
 import math
+import io
 import json
 import re
 import shlex
 import random
 import sys
+import itertools
+import collections
+import time
+import glob
+import urllib.parse
+import concurrent.futures
+from html import escape
 
 import youclidbackend
-from youclidbackend import primitives, colors
+from youclidbackend import primitives, assets, colors, coordinates, \
+    distribution, geometry, layout, manifest, payload, placement, profiling
 from youclidbackend.utils import _Step, _Clear, CaseInsensitiveDictionary
 from pprint import pprint
 import os
-import shutil
 
 polygons = {3: "Triangle",
             5: "Pentagon",
             6: "Hexagon",
             8: "Octagon"}
 
-obj_dict = {'polygon': {}, 'line': {}, 'point': {}, 'circle': {}, 'angle': {}}
-
 error_color = True
 
 
+class CompileError(Exception):
+    """Something that is wrong with the document that is being compiled"""
+    def __init__(self, name=None, msg=None, lineno=None):
+        super().__init__(name, msg, lineno)
+        self.name = name
+        self.msg = msg
+        self.lineno = lineno
+        # See CompileErrors
+        self.errors = [self]
+
+    def __str__(self):
+        s = ": ".join(x for x in (self.name, self.msg) if x is not None)
+        if self.lineno is not None:
+            s += " (line %d)" % int(self.lineno)
+        return s
+
+
+class CompileErrors(CompileError):
+    """All of the errors that were found in a document, for contexts that
+    collect them instead of stopping at the first one"""
+    def __init__(self, errors):
+        super().__init__(name="%d errors" % len(errors),
+                         msg="\n".join(str(e) for e in errors))
+        self.errors = errors
+
+
 def error(name=None, msg=None, lineno=None):
     """Wrapper function for error handling"""
-    if name is not None:
-        if error_color:
-            print("\033[31;1;4mError:\033[0m %s" % name, file=sys.stderr)
-        else:
-            print("Error: %s" % name, file=sys.stderr)
-    if msg is not None:
-        print(msg, file=sys.stderr)
-    if lineno is not None:
-        if error_color:
-            print("\033[32;1;4mLine Number:\033[0m %d" % int(lineno),
-                  file=sys.stderr)
+    raise CompileError(name, msg, lineno)
+
+
+def print_error(e, file=sys.stderr, path=None):
+    """Tell the user about a CompileError (or all of the ones in a
+    CompileErrors). If path is given, each error starts with path:lineno:
+    the way compilers print them, to tell the files of a build apart."""
+    for err in e.errors:
+        where = ""
+        if path is not None:
+            where = ("%s:%d: " % (path, int(err.lineno))
+                     if err.lineno is not None else "%s: " % path)
+        if err.name is not None:
+            if error_color:
+                print("%s\033[31;1;4mError:\033[0m %s" % (where, err.name),
+                      file=file)
+            else:
+                print("%sError: %s" % (where, err.name), file=file)
+        elif where:
+            print(where.rstrip(), file=file)
+        if err.msg is not None:
+            print(err.msg, file=file)
+        if err.lineno is not None:
+            if error_color:
+                print("\033[32;1;4mLine Number:\033[0m %d" % int(err.lineno),
+                      file=file)
 
+            else:
+                print("Line Number: %d" % int(err.lineno),
+                      file=file)
+
+
+def parse(source, context=None):
+    """Compile the source, which can be a string, a file object or any other
+    iterable of lines. The source is read exactly once, a line at a time.
+    Everything that the compile creates is kept in the context, so a new one
+    is made unless one is given.
+
+    Raises CompileError for the first problem with the document, or
+    CompileErrors for all of them if the context collects errors."""
+    if context is None:
+        context = Context()
+    formatter = _TextFormatter()
+    animations, angles = declare(context, _feed(source, formatter))
+
+    place(context)
+    for angle, lineno in angles:
+        parse_angle(context, angle, lineno=lineno)
+    # Create the output from the dictionary of objects
+    return create_output(context, formatter.result(), animations)
+
+
+class Context():
+    """The state of a single compile: the objects that have been declared,
+    the palette that they get their colors from and the random numbers that
+    are used to place them. Compiles that use different contexts don't share
+    anything, so they can run at the same time."""
+
+    def __init__(self, seed=None, collect_errors=False, exact=False,
+                 cache=None, candidates=1, profile=False, jobs=1,
+                 intersections=None):
+        self.symbols = SymbolTable()
+        # The objects of each type, by name
+        self.obj_dict = self.symbols.types
+        # The coordinates of the points
+        self.coords = coordinates.CoordinateStore()
+        self.palette = colors.Palette()
+        self.seed = seed
+        self.random = random.Random(seed)
+        # Whether to carry on with the next declaration after an error, so
+        # that all of them can be reported at once
+        self.collect_errors = collect_errors
+        self.errors = []
+        # Whether to intersect things with sympy instead of with floats
+        self.exact = exact
+        # The directory of the placement cache, if there is one
+        self.cache = cache
+        # How many random layouts to try, keeping the most spread out one
+        self.candidates = candidates
+        # How many processes to place the parts of the figure that don't
+        # depend on each other with
+        self.jobs = jobs
+        # An intersections.IntersectionCache, which can be shared between
+        # the contexts of a process
+        self.intersections = intersections
+        # What the solver did, if it is being profiled (see profiling.py)
+        self.profile = profiling.Profile() if profile else None
+
+    def fresh(self):
+        """A new context with the same options, for compiling again"""
+        return Context(self.seed, self.collect_errors, self.exact, self.cache,
+                       self.candidates, self.profile is not None, self.jobs,
+                       self.intersections)
+
+    def next_color(self):
+        return self.palette.next_color()
+
+    def report(self, e):
+        """Raise the error, or remember it if we're collecting errors"""
+        if not self.collect_errors:
+            raise e
+        self.errors.append(e)
+
+    def create(self, kind, name):
+        """Declare a new object of the given type ('point', 'line', ...)"""
+        if kind == 'point':
+            obj = primitives.Point(name, self.next_color(), self.coords)
         else:
-            print("Line Number: %d" % int(lineno),
-                  file=sys.stderr)
-    sys.exit(1)
-
-
-def parse(text):
-    tokens = tokenize(text)
+            obj = _primitives[kind](name, self.next_color())
+        self.symbols.add(kind, obj)
+        return obj
+
+    def get_or_create(self, kind, name):
+        """The object of the given type and name, which is declared if it
+        doesn't exist yet"""
+        obj = self.symbols.types[kind].get(name)
+        if obj is None:
+            obj = self.create(kind, name)
+        return obj
+
+
+_primitives = {'polygon': primitives.Polygon, 'line': primitives.Line,
+               'point': primitives.Point, 'circle': primitives.Circle,
+               'angle': primitives.Angle}
+
+
+class SymbolTable():
+    """Every object that has been declared, by type and name, and by name
+    alone for references (like lieson) that don't say what type they are"""
+
+    def __init__(self):
+        self.types = {kind: {} for kind in _primitives}
+        # The only object with each name
+        self.names = {}
+        # Names that more than one object has, with all of those objects
+        self.ambiguous = {}
+
+    def add(self, kind, obj):
+        self.types[kind][obj.name] = obj
+        other = self.names.setdefault(obj.name, obj)
+        if other is not obj:
+            self.ambiguous.setdefault(obj.name, [other]).append(obj)
+
+    def get(self, kind, name):
+        return self.types[kind].get(name)
+
+    def find(self, name, lineno=None):
+        """The object that a reference is to: either just its name, or its
+        type and then its name (like "circle c"). Returns None if there is no
+        such object."""
+        if name in self.ambiguous:
+            error(name="Ambiguous object",
+                  msg="Multiple objects are have name %s: %s" %
+                      (name, str([" ".join([x.__class__.__name__, x.name])
+                                  for x in self.ambiguous[name]])),
+                  lineno=lineno)
+        obj = self.names.get(name)
+        if obj is None:
+            kind = name.split()[0]
+            if kind not in self.types:
+                error(name="Undefined object %s" % kind,
+                      msg="You referenced an object that does not exist. "
+                          "Make sure that you defined lieson after the "
+                          "initial creation of the object",
+                      lineno=lineno)
+            obj = self.types[kind].get(" ".join(name.split()[1:]))
+        return obj
+
+
+def declare(context, tokens):
+    """Create the objects declared by the tokens in the context, without giving
+    them coordinates yet. Returns the animation steps, and the angles that
+    have to be parsed again once all of the points have been placed.
+    """
     parsers = CaseInsensitiveDictionary({
                                          "line": parse_line,
                                          "circle": parse_circle,
@@ -63,33 +249,53 @@ def parse(text):
     # A list of the objects that need to be drawn at each step
     animations = []
     # Ojbects that we've added at this step
-    curr_step = set()
+    # (a dict rather than a set, so that they stay in the order that they
+    # were declared in)
+    curr_step = {}
 
     # Iterate over all matches in the text
 
     a = []
-    for structure in tokens:
+    for structure in _until_error(context, tokens):
         match = structure['data']
         lineno = structure['lineno']
+        if not match:
+            context.report(CompileError(
+                name="Empty declaration",
+                msg="There is nothing between the brackets",
+                lineno=lineno))
+            continue
         # Get the dictionary of name and unnamed arguments
         args_dict = _parse_match(match)
 
         try:
             f = parsers[args_dict["type"]]
         except KeyError as e:
-            error(name="Undefined object name",
-                  msg="%s is not a valid object name" % args_dict["type"],
-                  lineno=lineno)
+            context.report(CompileError(
+                name="Undefined object name",
+                msg="%s is not a valid object name" % args_dict["type"],
+                lineno=lineno))
+            continue
+        try:
+            _check_declaration(args_dict, lineno)
+        except CompileError as e:
+            context.report(e)
+            continue
         # Call the appropriate parser function
         if(args_dict['type'] == 'angle'):
             a.append([args_dict, lineno])
         try:
-            obj = f(args_dict, lineno)
+            obj = f(context, args_dict, lineno)
         except NotImplementedError as e:
-            error(name="Reference to object before creation",
-                  msg=("You attempted to use to lieson keyword with an object "
-                       "that does not yet exist"),
-                  lineno=lineno)
+            context.report(CompileError(
+                name="Reference to object before creation",
+                msg=("You attempted to use to lieson keyword with an object "
+                     "that does not yet exist"),
+                lineno=lineno))
+            continue
+        except CompileError as e:
+            context.report(e)
+            continue
         # Now we need to handle the return value
 
         # Don't do anything special for locations
@@ -103,24 +309,66 @@ def parse(text):
             animations.append([x for x in curr_step])
         # Otherwise, if we parsed a clear, reset curr_step
         elif type(obj[0]) == _Clear:
-            curr_step = set()
+            curr_step = {}
         # Otherwise, we created some object, so add them to the current step
         # for display purposes
         else:
             if args_dict.get('color'):
                 n2 = obj[0].split("_")[1]
-                obj_dict[args_dict['type']][n2].color = colors.hex_to_rgba(args_dict['color'])
+                context.obj_dict[args_dict['type']][n2].color = colors.hex_to_rgba(args_dict['color'])
             for e in obj:
-                curr_step.add(e)
+                curr_step[e] = None
 
     # Ensure that we have something in the animations variable
     animations.append([x for x in curr_step])
 
-    constrain(obj_dict)
-    for angle, lineno in a:
-        parse_angle(angle, lineno=lineno)
-    # Create the output from the dictionary of objects
-    return create_output(obj_dict, text, animations)
+    if context.errors:
+        # The error in the markup, if there is one, is found while the
+        # declarations before it are, so it isn't always last
+        raise CompileErrors(sorted(context.errors,
+                                   key=lambda e: e.lineno or 0))
+
+    return animations, a
+
+
+def _until_error(context, tokens):
+    """The tokens, up to an error in the markup. Nothing after such an error
+    can be read, so no tokens come after it, but the errors of declarations
+    that were read before it can still be reported after it (see
+    declare())."""
+    try:
+        yield from tokens
+    except CompileError as e:
+        context.report(e)
+
+
+def _feed(source, formatter):
+    """Pass the prose and the markup of the source on to the text formatter
+    on their way to the parser"""
+    for piece in _scan(source):
+        if isinstance(piece, str):
+            formatter.add_text(piece)
+        else:
+            formatter.add_markup(piece[-1])
+            yield from piece
+
+
+# Regular expression matching a single token inside of our markup. The token
+# classes mirror what shlex.shlex(punctuation_chars=']=') produces, so that
+# tokenize() and _shlex_tokenize() give back exactly the same data:
+#   - runs of whitespace, which separate tokens and are thrown away
+#   - quoted strings, which keep their quotes
+#   - words, which may contain quote characters after the first character
+#   - runs of the punctuation characters "]" and "="
+#   - any other single character
+_markup_token = re.compile(r"""
+    (?P<space>[ \t\r\n]+)
+  | (?P<quoted>"[^"]*"|'[^']*')
+  | (?P<unclosed>["'])
+  | (?P<word>[\w~\-./*?][\w~\-./*?"']*)
+  | (?P<punctuation>[\]=]+)
+  | (?P<other>.)
+""", re.VERBOSE | re.ASCII | re.DOTALL)
 
 
 def tokenize(text):
@@ -128,6 +376,182 @@ def tokenize(text):
    'lineno': The line number of the source code where this declaration started
    'data': The actual matched content
    """
+    return list(iter_tokens(text))
+
+
+def iter_tokens(source):
+    """Generator version of tokenize(). The source can be a string, a file
+    object or any other iterable of lines, and the tokens are yielded as soon
+    as their closing bracket has been read.
+
+    Besides 'lineno' and 'data', each token has the keys 'start' and 'end',
+    the offsets in the source of its opening bracket and of the character
+    just after its closing bracket.
+    """
+    for piece in _scan(source):
+        if not isinstance(piece, str):
+            yield from piece
+
+
+def _scan(source, start=0, lineno=1):
+    """Split the source into prose and markup. Prose is yielded as strings,
+    and every top level markup declaration as the list of its tokens (the
+    last one being the declaration itself, the others nested in it).
+
+    If the source is a string, scanning can begin at offset start (which
+    must not be inside of markup) on line number lineno.
+
+    Prose outside of the brackets is never looked at; we jump straight from
+    one unescaped opening bracket to the next and only split the markup
+    itself into tokens. The only text that is kept around between two lines
+    is a markup declaration that has not been closed yet.
+    """
+
+    # Text that we haven't finished with yet
+    buffer = ''
+    # Offset in the source of the first character in buffer
+    offset = 0
+    # Where to start looking in the buffer, and the line number there
+    pos = start
+    # The character just before the buffer (to check for escaped brackets)
+    before = ''
+
+    # A string is already in memory, so there is no point in splitting it up
+    chunks = [source] if isinstance(source, str) else _lines(source)
+    for chunk in itertools.chain(chunks, [None]):
+        final = chunk is None
+        if not final:
+            buffer += chunk
+
+        while True:
+            # Jump to the next opening bracket that is not escaped
+            start = buffer.find('[', pos)
+            while start != -1 and \
+                    (buffer[start - 1] if start else before) == '\\':
+                start = buffer.find('[', start + 1)
+            if start == -1:
+                keep = len(buffer)
+                break
+
+            if start > pos:
+                yield buffer[pos:start]
+            lineno += buffer.count('\n', pos, start)
+            result = _read_markup(buffer, start, lineno, offset, final)
+            # If the markup continues on the next line, wait for it
+            if result is None:
+                keep = pos = start
+                break
+            tokens, pos = result
+            lineno += buffer.count('\n', start, pos)
+            yield tokens
+
+        if keep > pos:
+            yield buffer[pos:keep]
+        lineno += buffer.count('\n', pos, keep)
+        if keep:
+            before = buffer[keep - 1]
+        offset += keep
+        buffer = buffer[keep:]
+        pos = 0
+
+
+def _read_markup(text, start, lineno, offset, final):
+    """Tokenize the markup starting at the opening bracket text[start], which
+    is on line lineno, and text itself starts at offset in the source. Returns the list of tokens (more than one if there is
+    nested markup) and the position just after the closing bracket, or None if
+    the text ends before the markup does and more text may still follow.
+    """
+
+    # List of dictionaries to be returned
+    tokens = []
+    # Stack of the structures that we are currently filling (for nesting)
+    inner_tokens = [{'lineno': lineno, 'data': [], 'start': offset + start}]
+    counted_to = start
+    # The previous token (so that we can make sure that we don't parse
+    # things that are escaped)
+    previous = '['
+    # For parsing keyword arguments
+    kwarg = ""
+
+    pos = start + 1
+    end = len(text)
+    while inner_tokens:
+        if pos == end:
+            if not final:
+                return None
+            error(name="Mismatching brackets",
+                  msg="Opening bracket with no closing bracket",
+                  lineno=inner_tokens[-1]['lineno'])
+
+        match = _markup_token.match(text, pos)
+        kind = match.lastgroup
+        # A token that runs up to the end of the text might be continued by
+        # the next line
+        if not final and (match.end() == end or kind == 'unclosed'):
+            return None
+        pos = match.end()
+        x = match.group()
+        if kind == 'space':
+            continue
+        elif kind == 'unclosed':
+            error(name="No closing quotation",
+                  msg="A quoted string was never closed",
+                  lineno=inner_tokens[-1]['lineno'])
+
+        if x == '[' and previous != '\\':
+            lineno += text.count('\n', counted_to, match.start())
+            counted_to = match.start()
+            inner_tokens.append({'lineno': lineno, 'data': [],
+                                 'start': offset + match.start()})
+        # For keyword arguments, the name of the argument has already been
+        # stored as a token of its own, just like shlex would do
+        elif x == "=" and previous != '\\':
+            kwarg = previous + x
+        elif previous == "=" and kwarg:
+            if ((x[0] == x[-1]) and (x[0] == '"' or x[0] == "'")):
+                kwarg += x[1:-1]
+            else:
+                kwarg += x
+            inner_tokens[-1]['data'].append(kwarg)
+            kwarg = ""
+        elif x == ']' and previous != '\\':
+            inner_tokens[-1]['end'] = offset + match.start() + 1
+            tokens.append(inner_tokens.pop())
+        else:
+            inner_tokens[-1]['data'].append(x)
+        previous = x
+
+    return tokens, pos
+
+
+def _lines(source):
+    """Iterate over the lines of a string, a file object or any other iterable
+    of lines. Lines that don't end in a newline (for example the output of
+    str.splitlines()) get one, except for the very last line, so the result is
+    always the same as for the text that the lines were joined from.
+    """
+    if isinstance(source, str):
+        start = 0
+        while start < len(source):
+            end = source.find('\n', start) + 1 or len(source)
+            yield source[start:end]
+            start = end
+        return
+
+    previous = None
+    for line in source:
+        if previous is not None:
+            yield previous if previous.endswith('\n') else previous + '\n'
+        previous = line
+    if previous is not None:
+        yield previous
+
+
+def _shlex_tokenize(text):
+    """Tokenize the whole text with shlex, including the prose. This is the
+    original implementation of tokenize(), and it is only kept around so that
+    the two can be compared (see benchmarks/bench_tokenize.py)
+    """
 
     s = shlex.shlex(text, punctuation_chars=']=')
     # The next line is needed to remove the fact that shlex treats the "#"
@@ -205,6 +629,52 @@ def tokenize(text):
     return tokens
 
 
+# The fewest letters that the name of each kind of declaration can have (one
+# for each of its points), for the kinds that need a name
+_NAME_LETTERS = {'line': 2, 'circle': 1, 'point': 1, 'center': 1,
+                 'polygon': 1, 'triangle': 1, 'loc': 1, 'angle': 3}
+# The keywords that each kind of declaration needs
+_REQUIRED = {'center': ['circle']}
+# The keywords that need a value, rather than being there or not
+_VALUED = ['lieson', 'center', 'radius', 'circle', 'text', 'x', 'y', 'p1',
+           'p2', 'p3']
+
+
+def _check_declaration(args_dict, lineno=None):
+    """Raise a CompileError if the declaration (from _parse_match()) is
+    missing something that its parser needs"""
+    kind = args_dict['type'].lower()
+    letters = _NAME_LETTERS.get(kind)
+    if letters is None:
+        return
+    if kind == 'angle' and any(args_dict.get(k) for k in ('p1', 'p2', 'p3')):
+        # The points are given, so the name is just a name
+        letters = 1
+    name = args_dict.get('name')
+    if not isinstance(name, str) or not name:
+        error(name="Missing name",
+              msg="The %s needs a name, like [%s %s]" %
+                  (kind, kind, "ABC"[:letters]),
+              lineno=lineno)
+    if len(name) < letters:
+        error(name="Name too short",
+              msg="%ss are named with a letter for each of their %d "
+                  "points, but this one is %s" % (kind.capitalize(), letters,
+                                                  name),
+              lineno=lineno)
+    for key in _REQUIRED.get(kind, []):
+        if key not in args_dict:
+            error(name="Missing keyword",
+                  msg="The %s needs %s=, like [%s %s %s=...]" %
+                      (kind, key, kind, name, key),
+                  lineno=lineno)
+    for key in _VALUED:
+        if args_dict.get(key) is True:
+            error(name="Missing value",
+                  msg="%s needs a value, like %s=..." % (key, key),
+                  lineno=lineno)
+
+
 def _parse_match(partials):
     # Dictionary of named arguments
     args_dict = {}
@@ -235,26 +705,17 @@ def _parse_match(partials):
     return args_dict
 
 
-def parse_line(keyword_args, lineno=None):
+def parse_line(context, keyword_args, lineno=None):
     name = keyword_args["name"]
-    point_list = []
     ret = []
 
-    for p in name:
-        if obj_dict['point'].get(p) is None:
-            point = primitives.Point(p)
-            point_list.append(point)
-            obj_dict['point'][p] = point
-        else:
-            point_list.append(obj_dict['point'][p])
+    point_list = [context.get_or_create('point', p) for p in name]
 
-    if obj_dict['line'].get(name) is None:
-        line = primitives.Line(name)
+    line = context.symbols.get('line', name)
+    if line is None:
+        line = context.create('line', name)
         line.p1 = point_list[0]
         line.p2 = point_list[1]
-        obj_dict['line'][name] = line
-    else:
-        line = obj_dict['line'].get(name)
 
     for p in point_list:
         p.constraints.add(line)
@@ -264,14 +725,14 @@ def parse_line(keyword_args, lineno=None):
     return ret
 
 
-def parse_circle(keyword_args, lineno=None):
+def parse_circle(context, keyword_args, lineno=None):
     """Creates a circle object from the given parameters"""
 
     # Objects that we have created in this parse function, for display purposes
     ret = []
     name = keyword_args["name"]
 
-    circle = obj_dict['circle'].get(name)
+    circle = context.symbols.get('circle', name)
 
     if circle is not None:
         # TODO: We need to figure out what to do here. IE: do we just update
@@ -279,30 +740,17 @@ def parse_circle(keyword_args, lineno=None):
         # update anything?
         return ["circle_"+circle.name, "point_"+circle.p1.name, "point_"+circle.p2.name, "point_"+circle.p3.name]
     else:
-        circle = primitives.Circle(name)
-        obj_dict['circle'][name] = circle
+        circle = context.create('circle', name)
         ret.append("circle_"+circle.name)
         # TODO: JANKY WORKAROUND! MUST BE CHANGED
         if len(name) == 3:
-            p1 = obj_dict['point'].get(name[0])
-            # TODO: Call parse point?
-            if p1 is None:
-                p1 = primitives.Point(name[0])
-                obj_dict['point'][name[0]] = p1
+            p1 = context.get_or_create('point', name[0])
             p1.constraints.add(circle)
             ret.append("point_"+p1.name)
-            p2 = obj_dict['point'].get(name[1])
-            # TODO: Call parse point?
-            if p2 is None:
-                p2 = primitives.Point(name[1])
-                obj_dict['point'][name[1]] = p2
+            p2 = context.get_or_create('point', name[1])
             p2.constraints.add(circle)
             ret.append("point_"+p2.name)
-            p3 = obj_dict['point'].get(name[2])
-            # TODO: Call parse point?
-            if p3 is None:
-                p3 = primitives.Point(name[2])
-                obj_dict['point'][name[2]] = p3
+            p3 = context.get_or_create('point', name[2])
             p3.constraints.add(circle)
             ret.append("point_"+p3.name)
 
@@ -312,12 +760,8 @@ def parse_circle(keyword_args, lineno=None):
 
     center = keyword_args.get("center")
     if center is not None:
-        center = obj_dict['point'].get("center")
-
-        if center is None:
-            center = primitives.Point(keyword_args.get("center"))
-            obj_dict['point'][keyword_args.get("center")] = center
-            ret.append("point_"+center.name)
+        center = context.get_or_create('point', center)
+        ret.append("point_"+center.name)
         circle.center = center
 
     radius = keyword_args.get("radius")
@@ -325,7 +769,8 @@ def parse_circle(keyword_args, lineno=None):
         try:
             circle.radius = float(radius)
         except ValueError:
-            circle.radius = (obj_dict['point'].get(radius[0]), obj_dict['point'].get(radius[1]))
+            circle.radius = (context.symbols.get('point', radius[0]),
+                             context.symbols.get('point', radius[1]))
     if center is not None and circle.center.x is not None and radius is None:
         point = None
         if circle.p1.x is not None:
@@ -341,63 +786,46 @@ def parse_circle(keyword_args, lineno=None):
     return ret
 
 
-def parse_point(keyword_args, lineno=None):
+def parse_point(context, keyword_args, lineno=None):
     name = keyword_args["name"]
-    ret = []
-    if obj_dict['point'].get(name) is None:
-        point = primitives.Point(name)
-        ret = ["point_"+point.name]
-        obj_dict['point'][name] = point
-    else:
-        point = obj_dict['point'].get(name)
-        ret.append("point_"+point.name)
+    point = context.get_or_create('point', name)
+    ret = ["point_"+point.name]
     if keyword_args.get("random"):
         point.random = True
     if keyword_args.get("lieson") is not None:
-        _parse_lieson(keyword_args["lieson"], point)
+        _parse_lieson(context, keyword_args["lieson"], point, lineno)
 
     return ret
 
 
-def parse_center(keyword_args, lineno=None):
+def parse_center(context, keyword_args, lineno=None):
     # ASSUME CIRCLE ALREADY EXISTS
     name = keyword_args["name"]
     circle = keyword_args["circle"]
     ret = []
 
-    if obj_dict['point'].get(name):
-        point = obj_dict['point'].get(name)
-    else:
-        point = primitives.Point(name=name)
-        obj_dict['point'][name] = point
-    circle = obj_dict['circle'][circle]
+    point = context.get_or_create('point', name)
+    circle_name, circle = circle, context.obj_dict['circle'].get(circle)
+    if circle is None:
+        error(name="Undefined object circle",
+              msg="There is no circle %s. Make sure that it is declared "
+                  "before its center" % circle_name,
+              lineno=lineno)
     circle.center = point
     ret.append("point_"+point.name)
     return ret
 
 
-def parse_polygon(keyword_args, lineno=None):
+def parse_polygon(context, keyword_args, lineno=None):
     name = keyword_args['name']
-    point_list = []
-    ret = []
 
-    for p in name:
-        if obj_dict['point'].get(p) is None:
-            point = primitives.Point(p)
-            point_list.append(point)
-            obj_dict['point'][p] = point
-        else:
-            point_list.append(obj_dict['point'][p])
+    point_list = [context.get_or_create('point', p) for p in name]
 
-    if obj_dict['polygon'].get(name) is None:
-        polygon = primitives.Polygon(name)
+    polygon = context.symbols.get('polygon', name)
+    if polygon is None:
+        polygon = context.create('polygon', name)
         polygon.points = point_list
-        ret = ["polygon_"+polygon.name] + ["point_"+i.name for i in point_list]
-        obj_dict['polygon'][name] = polygon
-    else:
-        polygon = obj_dict['polygon'].get(name)
-        ret.append("polygon_"+polygon.name)
-        ret.extend(["point_"+i.name for i in point_list])
+    ret = ["polygon_"+polygon.name] + ["point_"+i.name for i in point_list]
 
     for p in point_list:
         p.constraints.add(polygon)
@@ -405,59 +833,36 @@ def parse_polygon(keyword_args, lineno=None):
     return ret
 
 
-def parse_triangle(keyword_args, lineno=None):
+def parse_triangle(context, keyword_args, lineno=None):
     """Small function to make dealing with triangles easier"""
     if keyword_args.get("text") is None:
         keyword_args['text'] = "triangle " + keyword_args["name"]
     keyword_args['type'] = "polygon"
-    return parse_polygon(keyword_args, lineno=lineno)
+    return parse_polygon(context, keyword_args, lineno=lineno)
 
 
-def parse_angle(keyword_args, lineno=None):
+def parse_angle(context, keyword_args, lineno=None):
     """Creates an angle object from the given parameters"""
 
     ret = []
     name = keyword_args['name']
-    angle = obj_dict['angle'].get(name)
+    angle = context.get_or_create('angle', name)
 
-    #if angle is not None:
-    #    return [angle, angle.p1, angle.p2, angle.p3]
-    if angle is None:
-        angle = primitives.Angle(name)
-        obj_dict['angle'][name] = angle
     if name and not (keyword_args.get("p1") or keyword_args.get("p2") or keyword_args.get("p3")):
-        p1 = obj_dict['point'].get(name[0])
-        if p1 is None:
-            p1 = primitives.Point(name[0])
-            obj_dict['point'][name[0]] = p1
-        p2 = obj_dict['point'].get(name[1])
-        if p2 is None:
-            p2 = primitives.Point(name[1])
-            obj_dict['point'][name[1]] = p2
-        p3 = obj_dict['point'].get(name[2])
-        if p3 is None:
-            p3 = primitives.Point(name[2])
-            obj_dict['point'][name[2]] = p3
+        p1 = context.get_or_create('point', name[0])
+        p2 = context.get_or_create('point', name[1])
+        p3 = context.get_or_create('point', name[2])
 
     else:
         p1 = keyword_args.get("p1")
         if p1 is not None:
-            p1 = obj_dict['point'].get(p1)
-            if p1 is None:
-                p1 = primitives.Point(keyword_args.get("p1"))
-                obj_dict['point'][keyword_args.get("p1")] = p1
+            p1 = context.get_or_create('point', p1)
         p2 = keyword_args.get("p2")
         if p2 is not None:
-            p2 = obj_dict['point'].get(p2)
-            if p2 is None:
-                p2 = primitives.Point(keyword_args.get("p2"))
-                obj_dict['point'][keyword_args.get("p2")] = p2
+            p2 = context.get_or_create('point', p2)
         p3 = keyword_args.get("p3")
         if p3 is not None:
-            p3 = obj_dict['point'].get(p3)
-            if p3 is None:
-                p3 = primitives.Point(keyword_args.get("p3"))
-                obj_dict['point'][keyword_args.get("p3")] = p3
+            p3 = context.get_or_create('point', p3)
 
     big = keyword_args.get("big")
     if big is not None:
@@ -509,11 +914,11 @@ def get_degree(p1, p2, p3):
         return (360 - abs(in_degrees))
 
 
-def parse_location(keyword_args, lineno=None):
+def parse_location(context, keyword_args, lineno=None):
     """Parses the location for a particular point object"""
     name = keyword_args["name"]
     if keyword_args.get("random"):
-        x, y = random.uniform(-1, 1), random.uniform(-1, 1)
+        x, y = context.random.uniform(-1, 1), context.random.uniform(-1, 1)
     else:
         try:
             x = float(keyword_args["x"])
@@ -537,11 +942,7 @@ def parse_location(keyword_args, lineno=None):
             error(name="Not a number",
                   msg="You did not specify a number for the y coordinate",
                   lineno=lineno)
-    if obj_dict['point'].get(name):
-        o = obj_dict['point'][name]
-    else:
-        o = primitives.Point(keyword_args["name"])
-        obj_dict['point'][name] = o
+    o = context.get_or_create('point', name)
     ret = o
 
     o.x = x
@@ -550,46 +951,16 @@ def parse_location(keyword_args, lineno=None):
     return ["point_"+ret.name]
 
 
-def parse_step(keyword_args, lineno=None):
+def parse_step(context, keyword_args, lineno=None):
     return [_Step()]
 
 
-def parse_clear(keyword_args, lineno=None):
+def parse_clear(context, keyword_args, lineno=None):
     return [_Clear()]
 
 
-def _parse_lieson(parameters, point, lineno=None):
-    lieson_obj = None
-    valid = []
-    for v in obj_dict:
-        lieson_obj = obj_dict[v].get(parameters)
-        if lieson_obj is not None:
-            valid.append(lieson_obj)
-
-    if len(valid) > 1:
-        error(name="Ambiguous object",
-              msg="Multiple objects are have name %s: %s" %
-                   (parameters, str([" ".join([x.__class__.__name__, x.name])
-                                     for x in valid])),
-              lineno=lineno)
-    elif len(valid) == 1:
-        lieson_obj = valid[0]
-    else:
-        lieson_obj = None
-
-    if lieson_obj is None:
-        lieson_type = parameters.split()[0]
-        lieson_name = " ".join(parameters.split()[1:])
-        try:
-            tmp = obj_dict[lieson_type]
-        except KeyError:
-            error(name="Undefined object %s" % lieson_type,
-                  msg="You referenced an object that does not exist. Make "
-                      "sure that you defined lieson after the initial creation"
-                      " of the object",
-                  lineno=lineno)
-        if tmp is not None:
-            lieson_obj = tmp.get(lieson_name)
+def _parse_lieson(context, parameters, point, lineno=None):
+    lieson_obj = context.symbols.find(parameters, lineno)
     if lieson_obj is None:
         raise NotImplementedError
     else:
@@ -597,177 +968,586 @@ def _parse_lieson(parameters, point, lineno=None):
         point.lies_on.add(lieson_obj)
 
 
-def constrain(obj_dict):
-    """Takes in a object dictionary and modifies points, giving them
-    coordinates"""
-
-    point_set = set()
-    for obj in obj_dict['point'].values():
+def place(context):
+    """Gives coordinates to the points in the context, from the placement
+    cache if the same figure has been placed before"""
+    if context.cache is None:
+        constrain(context)
+        return
+    start = time.perf_counter()
+    key = placement.key(context)
+    if not placement.load(context, context.cache, key):
+        constrain(context)
+        placement.store(context, context.cache, key)
+    elif context.profile is not None:
+        context.profile.cached = True
+        context.profile.time += time.perf_counter() - start
+        for p in context.obj_dict['point'].values():
+            context.profile.placed(p, 'cache')
+
+
+def constrain(context):
+    """Gives coordinates to the points in the context. If the context asks
+    for more than one candidate layout, the one where the points are the
+    most spread out is kept."""
+    start = time.perf_counter()
+    if context.candidates > 1:
+        _constrain_spread(context)
+    else:
+        _constrain_components(context)
+    if context.profile is not None:
+        context.profile.layouts += context.candidates
+        context.profile.time += time.perf_counter() - start
+
+
+def _solve(context, rng, anywhere, points=None):
+    """Place the points (all of the ones in the context by default) that
+    don't have coordinates, using anywhere(point) for the ones that can go
+    anywhere and rng for every other random choice"""
+    profile = context.profile
+
+    def placed(p, branch):
+        if profile is not None:
+            profile.placed(p, branch)
+
+    if points is None:
+        points = context.obj_dict['point'].values()
+    todo = []
+    for obj in points:
         if obj.x is None and obj.y is None:
                 if obj.random is True:
-                    obj.x = random.uniform(-1, 1)
-                    obj.y = random.uniform(-1, 1)
-                else:
-                    point_set.add(obj)
-
-    i = 0
-    points = [y for y in point_set]
-
-    old_len = None
-
-    while points:
-        if i == len(points):
-            # Ensure that something has changed
-            if old_len == len(points):
-                p = final_check(points)
-                if p is None:
-                    # If nothing has changed, error out
-                    error(name="Underconstrained system",
-                          msg="Unable to place the following points: " +
-                              str([x.name for x in points]))
+                    obj.x, obj.y = anywhere(obj)
+                    placed(obj, 'random')
                 else:
-                    points.remove(p)
-                    i = 0
-                    continue
-            # Modular arithmetic
-            old_len = len(points)
-            i = 0
-        # Get the current point
-        p = points[i]
+                    todo.append(obj)
+        else:
+            placed(obj, 'given')
 
+    for p in _placement_order(todo, profile):
+        record = profile.point(p) if profile is not None else None
+        with profiling.timed(record, 'shape_time'):
+            on = [c for c in _on(p) if _shape(context, c) is not None]
         # If there are no constraints on the point, generate it randomly
-        if len(p.constraints) == 0:
-            p.x = random.uniform(-1, 1)
-            p.y = random.uniform(-1, 1)
-            points.remove(p)
-            i = 0
+        if not on:
+            p.x, p.y = anywhere(p)
+            placed(p, 'anywhere')
             continue
-        # If there is one constraint on the point, we can plcae it anywhere
-        # on the constraint
-        elif len(p.constraints) == 1:
-            obj = list(p.constraints)[0]
-            # Check the symify constraint because of the fact that arbitrary
-            # point calls it
-            if obj is None or obj.symify() is None:
-                i += 1
+        # Otherwise, pick one of the places where all of the constraints meet
+        if len(on) > 1:
+            with profiling.timed(record, 'intersection_time'):
+                intersection = _intersection(context, on)
+            if record is not None:
+                record['intersections'] += len(intersection)
+            if intersection:
+                r = rng.randint(0, len(intersection) - 1)
+                p.x, p.y = intersection[r]
+                placed(p, 'intersection')
                 continue
+        # If there is only one constraint (or they don't meet), we can place
+        # it anywhere on one of them
+        p.x, p.y = on[0].arbitrary_point(rng)
+        placed(p, 'arbitrary')
+
+
+def _constrain_components(context):
+    """Place the points, solving each part of the figure that doesn't share
+    any points with the rest on its own, on a process pool if the context
+    has more than one job"""
+    points = list(context.obj_dict['point'].values())
+    groups = [g for g in _components(points)
+              if any(p.x is None and p.y is None for p in g)]
+    if len(groups) <= 1:
+        def anywhere(p):
+            return context.random.uniform(-1, 1), context.random.uniform(-1, 1)
+        _solve(context, context.random, anywhere)
+        return
+
+    if context.profile is not None:
+        placing = {p for g in groups for p in g}
+        for p in points:
+            if p not in placing:
+                context.profile.placed(p, 'given')
+    # Each part gets its own random numbers, so that the figure is the same
+    # however many processes it is placed with
+    seeds = [context.random.getrandbits(64) for g in groups]
+    if context.jobs > 1 and sum(map(len, groups)) >= PARALLEL_POINTS:
+        results = list(_process_pool(context.jobs).map(
+            _solve_packed, [_pack(g) for g in groups], seeds,
+            itertools.repeat(context.exact),
+            itertools.repeat(context.profile is not None)))
+        for coords, radii, records in results:
+            _merge(context, coords, radii, records)
+    else:
+        for g, seed in zip(groups, seeds):
+            _solve(context, *_seeded(seed), points=g)
 
-            p.x, p.y = obj.arbitrary_point()
 
-            # Start the iteration over
-            i = 0
-            points.remove(p)
-        # Otherwise, there are multiple constraints
-        else:
-            symified_constraints = []
-            # Get all of the constraints that we have processed and given
-            # locations to
-            for x in p.constraints:
-                tmp = x.symify()
-                if tmp is not None:
-                    symified_constraints.append(tmp)
-            # Ensure that we have at least two constraints
-            # (to define an intersection); if not go to the next point
-            if len(symified_constraints) < 2:
-                i += 1
-                continue
-            # Compute the intersection
-            intersection = sympy.intersection(*symified_constraints)
+# Figures with fewer points than this are placed in this process, since
+# sending them to others takes longer than placing them
+PARALLEL_POINTS = 64
+# The process pool and how many processes it has
+_pool = None, 0
 
-            # If there was no intersection, continue
-            if intersection == []:
-                i += 1
-                continue
-            # Otherwise, we have a list of possible intersections, pick
-            # one of them randomly to use
-            else:
-                r = random.randint(0, len(intersection) - 1)
-                p.x = float(intersection[r].x)
-                p.y = float(intersection[r].y)
-                i = 0
-                points.remove(p)
+
+def _process_pool(jobs):
+    """The process pool for placing parts of figures, which is kept for
+    the next compile"""
+    global _pool
+    pool, size = _pool
+    if size != jobs:
+        if pool is not None:
+            pool.shutdown()
+        _pool = concurrent.futures.ProcessPoolExecutor(jobs), jobs
+    return _pool[0]
+
+
+def _seeded(seed):
+    """The random numbers for a part of the figure, and where to put the
+    points in it that can go anywhere"""
+    rng = random.Random(seed)
+    return rng, lambda p: (rng.uniform(-1, 1), rng.uniform(-1, 1))
 
 
-def final_check(points):
-    """Performs a final check to make sure there are no constraints that
-    we can do anything with"""
+def _components(points):
+    """The points, split into groups where no object refers to points in
+    more than one group. The groups are in the order that their first
+    points are in."""
+    # Union-find
+    parent = {p: p for p in points}
+
+    def find(p):
+        while parent[p] is not p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
     for p in points:
-        constraints = p.constraints
-        if len(p.lies_on) == 1:
-            if [x for x in p.lies_on][0].symify() is not None:
-                p.x, p.y = [x for x in p.lies_on][0].arbitrary_point()
-                return p
-            else:
-                return None
-        elif len(p.lies_on) > 1:
-            symified_constraints = []
-            # Get all of the constraints that we have processed and given
-            # locations to
-            for x in p.lies_on:
-                tmp = x.symify()
-                if tmp is not None:
-                    symified_constraints.append(tmp)
-            # Ensure that we have at least two constraints
-            # (to define an intersection); if not go to the next point
-            if len(symified_constraints) >= 2:
-                # Compute the intersection
-                intersection = sympy.intersection(*symified_constraints)
-                if intersection:
-                    p.x = float(intersection[0].x)
-                    p.y = float(intersection[0].y)
-                    return p
-            else:
-                return None
+        for c in p.constraints:
+            for q in _references(c):
+                parent[find(q)] = find(p)
 
-        if all([type(c) == primitives.Line for c in constraints]):
-            p.x = random.uniform(-1, 1)
-            p.y = random.uniform(-1, 1)
-            return p
-        elif [type(c) for c in constraints].count(primitives.Circle) == 1:
-            for c in constraints:
-                if type(c) == primitives.Circle:
-                    circle = c
-                    break
-            if circle.symify() is not None:
-                p.x, p.y = circle.arbitrary_point()
-                return p
-    return None
-
-
-def format_text(text):
-    newtext = []
-    text = text.split('\n')
-    step = [0]
-    for i in text:
-        i = i.replace('[definitions]', '')
-        i = i.replace('[clear]', '')
-        if not i.startswith('[loc'):
-            newtext.append(i)
-    newtext = newtext[:-1]
-    text = newtext
-    text = '\n'.join(text)
-
-    regex = r"(?<!\\)\[([\s\S]*?)(?<!\\)\]"
-    # pattern = r'(\[)([a-zA-Z]+) ([^\]]+)([\s\S]*?)\]'
-    replaced = re.sub(regex, lambda text: get_text(text, step), text)
-    start = "<div id='step_0'>"
-    end = "</div>"
-    result = "%s %s %s" % (start, replaced, end)
-    return result
-
-
-def get_text(match, step):
-    match = match[1]
-    if(match == 'step'):
+    groups = collections.OrderedDict()
+    for p in points:
+        groups.setdefault(find(p), []).append(p)
+    return list(groups.values())
+
+
+def _references(c):
+    """Every point that the object refers to"""
+    if isinstance(c, primitives.Polygon):
+        return list(c.points)
+    ret = [c.p1, c.p2]
+    if isinstance(c, primitives.Circle):
+        ret += [c.p3, c.center]
+        if type(c.radius) is tuple:
+            ret.extend(c.radius)
+    return [q for q in ret if q is not None]
+
+
+def _pack(points):
+    """The points and the objects that they are on, with every reference to
+    a point replaced by its name, to send to another process. Pickling the
+    objects themselves would send the whole graph of objects that they refer
+    to, which is larger and slower than these names and coordinates."""
+    def name(q):
+        return q.name if isinstance(q, primitives.Point) else q
+
+    objects = collections.OrderedDict()
+    packed_points = []
+    for p in points:
+        keys = []
+        for c in p.constraints:
+            key = (type(c).__name__.lower(), c.name)
+            keys.append(key)
+            if key in objects:
+                continue
+            if isinstance(c, primitives.Polygon):
+                attrs = {'points': [q.name for q in c.points]}
+            else:
+                attrs = {'p1': name(c.p1), 'p2': name(c.p2)}
+            if isinstance(c, primitives.Circle):
+                attrs.update(p3=name(c.p3), center=name(c.center),
+                             radius=(tuple(name(q) for q in c.radius)
+                                     if type(c.radius) is tuple
+                                     else c.radius))
+            objects[key] = attrs
+        packed_points.append((p.name, p.x, p.y, p.random, keys))
+    return packed_points, list(objects.items())
+
+
+def _unpack(packed):
+    """The points that _pack() packed, with new objects"""
+    packed_points, packed_objects = packed
+    points = collections.OrderedDict()
+    store = coordinates.CoordinateStore()
+    for name, x, y, is_random, keys in packed_points:
+        p = points[name] = primitives.Point(name, color=0, store=store)
+        p.x, p.y, p.random = x, y, is_random
+
+    def point(value):
+        if isinstance(value, str):
+            return points[value]
+        elif isinstance(value, (list, tuple)):
+            return type(value)(point(n) for n in value)
+        return value
+
+    objects = {}
+    for (kind, name), attrs in packed_objects:
+        obj = _primitives[kind](name, color=0)
+        for attr, value in attrs.items():
+            setattr(obj, attr, point(value))
+        objects[kind, name] = obj
+    for name, x, y, is_random, keys in packed_points:
+        points[name].constraints = {objects[key] for key in keys}
+    return list(points.values())
+
+
+def _solve_packed(packed, seed, exact, profile):
+    """Place the points that _pack() packed, in a worker process. Returns
+    their coordinates, the radii of the circles that go through them and,
+    if it is profiled, what the solver did."""
+    context = Context(exact=exact, profile=profile)
+    points = _unpack(packed)
+    _solve(context, *_seeded(seed), points=points)
+    circles = {c for p in points for c in p.constraints
+               if isinstance(c, primitives.Circle)}
+    radii = {c.name: (c.radius[0].name, c.radius[1].name) for c in circles
+             if type(c.radius) is tuple}
+    records = context.profile.points if profile else None
+    return {p.name: (p.x, p.y) for p in points}, radii, records
+
+
+def _merge(context, coords, radii, records):
+    """Put what _solve_packed() returns into the context"""
+    points = context.obj_dict['point']
+    for name, (x, y) in coords.items():
+        points[name].x, points[name].y = x, y
+    for name, (center, point) in radii.items():
+        circle = context.obj_dict['circle'][name]
+        if circle.radius is None:
+            circle.radius = (points[center], points[point])
+    if records is not None:
+        context.profile.points.update(records)
+
+
+def _constrain_spread(context):
+    """Place the points once for each candidate layout, and keep the layout
+    that layout.score() likes best"""
+    if layout.numpy is None:
+        error(name="Missing dependency",
+              msg="Trying more than one layout needs numpy (pip install "
+                  "numpy)")
+    points = list(context.obj_dict['point'].values())
+    moving = [p.x is None and p.y is None for p in points]
+    index = {p: i for i, p in enumerate(points)}
+    # Circles that go through points get their radius while they are placed
+    circles = [c for c in context.obj_dict['circle'].values()
+               if c.radius is None]
+
+    rng = layout.generator(context.random.getrandbits(64))
+    candidates = context.candidates
+    anywhere = layout.sample(rng, candidates, len(points))
+    seeds = rng.integers(2 ** 63, size=candidates)
+    coords = layout.numpy.empty((candidates, len(points), 2))
+    radii = []
+    # Where each point is in the context's coordinate store
+    columns = layout.numpy.array([p.index for p in points], dtype=int)
+    # What the solver did for each candidate, if it is profiled, so that
+    # the profile can be of the one that is kept
+    profile = context.profile
+    before = profile.points if profile is not None else None
+    records = []
+    for k in range(candidates):
+        if profile is not None:
+            profile.points = {name: dict(record)
+                              for name, record in before.items()}
+        _solve(context, random.Random(int(seeds[k])),
+               lambda p: tuple(float(v) for v in anywhere[k, index[p]]))
+        if profile is not None:
+            records.append(profile.points)
+        coords[k] = context.coords.numpy()[columns]
+        radii.append([c.radius for c in circles])
+        for p, m in zip(points, moving):
+            if m:
+                p.x = p.y = None
+        for c in circles:
+            c.radius = None
+
+    best = int(layout.score(coords, moving).argmax())
+    if profile is not None:
+        profile.points = records[best]
+    for p, (x, y) in zip(points, coords[best].tolist()):
+        p.x, p.y = x, y
+    for c, radius in zip(circles, radii[best]):
+        c.radius = radius
+
+
+def constraint_graph(context):
+    """The objects in the context and how they depend on each other, in
+    Graphviz's format, with what the solver did for each point if the
+    context was profiled"""
+    objects = []
+    edges = []
+    for kind, objs in context.obj_dict.items():
+        for obj in objs.values():
+            obj_id = kind + "_" + str(obj.name)
+            objects.append((obj_id, type(obj).__name__, str(obj.name)))
+            if isinstance(obj, primitives.Point):
+                for c in _on(obj):
+                    edges.append((_graph_id(c), obj_id, 'on'))
+            elif not isinstance(obj, primitives.Angle):
+                # The center of a circle is also one end of its radius
+                names = {q.name for q in _defined_by(obj) if q is not None}
+                for name in sorted(names):
+                    edges.append(("point_" + name, obj_id, 'defines'))
+    return profiling.dot(objects, edges, context.profile)
+
+
+def _graph_id(obj):
+    return type(obj).__name__.lower() + "_" + str(obj.name)
+
+
+def _placement_order(points, profile=None):
+    """The order to place the points in, so that every point comes after the
+    points that the objects that it is on depend on. If there is no such
+    order, a point is placed as soon as any of the objects that it is on can
+    be, and if that doesn't help either, the chain of dependencies that
+    stops the points from being placed is reported. The profile counts how
+    many times each point had to wait."""
+    # The points that will have been placed by the time we get to the
+    # current one (the ones that already have coordinates aren't included)
+    placed = set()
+    # The points that have to be looked at again when a point is placed
+    waiting = collections.defaultdict(list)
+    for p in points:
+        for c in _on(p):
+            for q in _needs(c):
+                waiting[q].append(p)
+
+    order = []
+    queue = collections.deque(points)
+    left = list(points)
+    while True:
+        while queue:
+            p = queue.popleft()
+            if p in placed:
+                continue
+            if not all(_available(c, placed) for c in _on(p)):
+                if profile is not None:
+                    profile.point(p)['waited'] += 1
+                continue
+            placed.add(p)
+            order.append(p)
+            queue.extend(waiting[p])
+
+        left = [p for p in left if p not in placed]
+        if not left:
+            return order
+        # Everything that is left is waiting for something. Place the first
+        # point that is on something that we can place it on.
+        p = next((p for p in left
+                  if any(_available(c, placed) for c in _on(p))), None)
+        if p is None:
+            error(name="Underconstrained system",
+                  msg="Unable to place the following points: %s\n%s" %
+                      (str([x.name for x in left]),
+                       _blocking_chain(left[0], placed)))
+        placed.add(p)
+        order.append(p)
+        queue.extend(waiting[p])
+
+
+def _on(p):
+    """The objects that the point has to be placed on, in a fixed order. The
+    objects that the point helps to define (like the lines that it is an end
+    of) don't say where it goes."""
+    on = [c for c in p.constraints
+          if not any(p is q for q in _defined_by(c))]
+    on.sort(key=lambda c: (type(c).__name__, str(c.name)))
+    return on
+
+
+def _defined_by(c):
+    """The points that are needed to tell where the object is"""
+    if isinstance(c, primitives.Circle):
+        ret = [c.center]
+        if type(c.radius) is tuple:
+            ret.extend(c.radius)
+        return ret
+    elif isinstance(c, primitives.Polygon):
+        return c.points
+    return [c.p1, c.p2]
+
+
+def _needs(c):
+    """The points that the object can wait for before it can be placed"""
+    if isinstance(c, primitives.Circle) and c.radius is None:
+        return _defined_by(c) + [c.p1, c.p2, c.p3]
+    return _defined_by(c)
+
+
+def _available(c, placed):
+    """Whether the object can be placed, if the points in placed are"""
+    if not all(_is_placed(q, placed) for q in _defined_by(c)):
+        return False
+    if isinstance(c, primitives.Circle) and c.radius is None:
+        # The radius is the distance to the first point on the circle that
+        # is placed
+        return any(_is_placed(q, placed) for q in (c.p1, c.p2, c.p3))
+    return True
+
+
+def _is_placed(q, placed):
+    return q is not None and (q.x is not None or q in placed)
+
+
+def _blocking_chain(p, placed):
+    """Describes what stops the point from being placed, like
+    "A is on Line CD, which needs C, which is on Line AB, which needs A"."""
+    start = p.name
+    chain = []
+    seen = set()
+    while p not in seen:
+        seen.add(p)
+        c = _on(p)[0]
+        p = next((q for q in _needs(c)
+                  if q is not None and not _is_placed(q, placed) and
+                  q is not p), None)
+        if p is None:
+            chain.append("is on %s %s, which can't be placed" %
+                         (type(c).__name__, c.name))
+            break
+        chain.append("is on %s %s, which needs %s" %
+                     (type(c).__name__, c.name, p.name))
+    return start + " " + ", which ".join(chain)
+
+
+def _shape(context, obj):
+    """The geometry of the object for _intersection(), or None if it hasn't
+    been placed yet"""
+    if isinstance(obj, primitives.Circle) and obj.radius is None:
+        _fix_radius(obj)
+    return obj.symify() if context.exact else obj.numify()
+
+
+def _fix_radius(circle):
+    """Give a circle that goes through points, but whose radius wasn't
+    given, the distance from its center to the first of those points that
+    has been placed as its radius, if one has"""
+    for q in (circle.p1, circle.p2, circle.p3):
+        if q is not None and q.x is not None:
+            circle.radius = (circle.center, q)
+            return
+
+
+def _intersection(context, objs):
+    """The (x, y) points where all of the objects meet, which mustn't be
+    changed. They are looked up in the context's intersection cache, if it
+    has one."""
+    shapes = [_shape(context, c) for c in objs]
+    cache = context.intersections
+    if cache is None:
+        return _intersect(context, shapes)
+    key = cache.key(context.exact, [c.numify() for c in objs])
+    points = cache.get(key)
+    if points is None:
+        points = tuple(_intersect(context, shapes))
+        cache.put(key, points)
+    return points
+
+
+def _intersect(context, shapes):
+    """The (x, y) points where all of the shapes meet. Unless the context is
+    exact, this is done with floats, which is a lot faster than sympy."""
+    if not context.exact:
+        return geometry.intersection(*shapes)
+    # Shapes that overlap can also meet in a segment or an arc, which we
+    # can't place a point at
+    return [(float(i.x), float(i.y)) for i in sympy.intersection(*shapes)
+            if isinstance(i, sympy.Point)]
+
+
+def format_text(source):
+    """Turn the source (a string, file object or iterable of lines) into the
+    HTML text that is shown next to the figure"""
+    formatter = _TextFormatter()
+    for piece in _scan(source):
+        if isinstance(piece, str):
+            formatter.add_text(piece)
+        else:
+            formatter.add_markup(piece[-1])
+    return formatter.result()
+
+
+class _TextFormatter():
+    """Builds the HTML text from the prose and the markup tokens as they come
+    out of the scanner, so the text is put together in the same pass that
+    reads the geometry.
+    """
+
+    def __init__(self):
+        self.pieces = []
+        self.step = [0]
+        # The parts of the line that we are currently working on
+        self.line = []
+        # Whether we've only seen [clear] and [definitions] on this line
+        self.blank = True
+        # Lines that start with a location are left out of the text
+        self.loc = False
+        # The last line that we kept. The last line of the text is dropped,
+        # so we can only add a line once we know that it's not the last one
+        self.held = None
+
+    def add_text(self, text):
+        lines = text.split('\n')
+        for i, part in enumerate(lines):
+            if i:
+                self._end_line()
+            if part:
+                self.line.append(part)
+                self.blank = False
+
+    def add_markup(self, token):
+        # Declarations with something missing are reported by declare()
+        if not token['data']:
+            return
+        args_dict = _parse_match(token['data'])
+        if args_dict['type'] in ('clear', 'definitions'):
+            return
+        if self.blank and args_dict['type'] == 'loc':
+            self.loc = True
+        self.blank = False
+        self.line.append(get_text(args_dict, self.step))
+
+    def result(self):
+        self._end_line()
+        start = "<div id='step_0'>"
+        end = "</div>"
+        return "%s %s %s" % (start, ''.join(self.pieces), end)
+
+    def _end_line(self):
+        if not self.loc:
+            if self.held is not None:
+                if self.pieces:
+                    self.pieces.append('\n')
+                self.pieces.append(self.held)
+            self.held = ''.join(self.line)
+        self.line = []
+        self.blank = True
+        self.loc = False
+
+
+def get_text(args_dict, step):
+    """Returns the HTML for a single markup declaration in the text"""
+    if args_dict['type'] == 'step':
         step[0] += 1
         return "</div><div id='step_%d'>" % step[0]
-    args_dict = _parse_match(shlex.split(match))
     # We need to replace "center" with "point" in order to get the correct
     # highlighting on the frontend
     t = args_dict['type'] if args_dict['type'] != 'center' else 'point'
     # TODO: Hack, this should be changed
     t = 'polygon' if t == 'triangle' else t
-    span_name = "text_%s_%s_%s" % (t, t, args_dict['name'])
+    span_name = "text_%s_%s_%s" % (t, t, args_dict.get('name', ''))
     output = " <span name=%s class='GeoElement'>{text}</span>" % span_name
     if (args_dict.get('hidden', False)):
         return ""
@@ -775,70 +1555,358 @@ def get_text(match, step):
         return output.format(text=args_dict['text'])
     if (args_dict['type'] == "Polygon"):
         length = (len(args_dict['points']) if args_dict.get('points', False)
-                  else len(args_dict['name']))
+                  else len(args_dict.get('name', '')))
         args_dict['type'] = polygons.get(length, "Polygon")
-    obj_text = "%s %s" % (args_dict['type'], args_dict['name'])
+    obj_text = "%s %s" % (args_dict['type'], args_dict.get('name', ''))
     return output.format(text=obj_text)
 
 
-def create_output(d, text, animations):
+def create_output(context, text, animations):
+    """Build the intermediate representation from the objects in the context,
+    the formatted text (see format_text()) and the animation steps"""
     output = {}
 
-    output['text'] = format_text(text)
+    output['text'] = text
     output['geometry'] = {}
     output['animations'] = animations
 
-    for k, val in d.items():
+    # The coordinates of all of the points at once, rather than a point at a
+    # time
+    xs, ys = context.coords.tolist()
+    for k, val in context.obj_dict.items():
         for key, v in val.items():
+            if k == 'point' and v.store is context.coords:
+                data = {'x': xs[v.index], 'y': ys[v.index]}
+            else:
+                data = v.__dict__()
             output['geometry'][k + "_" + v.name] = {
                                           'type': v.__class__.__name__,
                                           'id': k + "_" + v.name,
                                           'color': v.color,
-                                          'data': v.__dict__(),
+                                          'data': data,
                                           'label': v.name
                                          }
 
     return output
 
 
-def generate_html(json_object, final, path=None):
-    html = ""
-    # I hope that this is the right way to do this? If not, someone tell me
-    basepath = youclidbackend.__path__[0]
-    with open(basepath + "/data/template.html", 'r') as f:
-        html = f.read()
-
-    html = html.replace("// insert json here", json.dumps(json_object,
-                                                          indent=4))
-    html = html.replace("<!-- Insert the text here -->",
-                        json_object['text'].replace("\n", "<br>\n        "))
-
-    if not final:
-        html = html.replace("styles/default.css",
-                            youclidbackend.__path__[0] + "/data/styles/default.css")
-        html = html.replace("draw.js",
-                            youclidbackend.__path__[0] + "/data/draw.js")
-        html = html.replace("index.js",
-                            youclidbackend.__path__[0] + "/data/index.js")
-    else:
+# The places in the template that generate_html() fills in
+_SLOTS = collections.OrderedDict([
+    ('json', "// insert json here"),
+    ('text', "<!-- Insert the text here -->"),
+    ('links', "<!-- Insert the links here -->"),
+    ('styles/default.css', "styles/default.css"),
+    ('styles/light.css', "styles/light.css"),
+    ('draw.js', "draw.js"),
+    ('index.js', "index.js"),
+])
+_template = None
+
+
+def _template_segments():
+    """The template, split at its slots: a list that alternates between
+    text to copy as it is and the name of a slot, read from disk the first
+    time that it is needed"""
+    global _template
+    if _template is None:
+        with open(youclidbackend.__path__[0] + "/data/template.html") as f:
+            html = f.read()
+        pattern = "(%s)" % "|".join(re.escape(m) for m in _SLOTS.values())
+        names = {marker: name for name, marker in _SLOTS.items()}
+        _template = [piece if i % 2 == 0 else names[piece]
+                     for i, piece in enumerate(re.split(pattern, html))]
+    return _template
+
+
+def generate_html(json_object, final, path=None, packed=False):
+    """Put the compiled document into the HTML template. If final is set, the
+    page refers to the styles and scripts next to it, and if a path is given
+    as well, it is written there as index.html along with those files. If
+    packed is set, the geometry is put in the page as typed arrays (see
+    payload.py) instead of as JSON."""
+    html = io.StringIO()
+    write_html(html, json_object, final, packed)
+    html = html.getvalue()
+    if final and path is not None:
+        copy_assets(path)
         with open(path + "/index.html", 'w') as f:
             f.write(html)
-        to_copy = [
-            "/styles/default.css",
-            "/styles/light.css",
-            "/draw.js",
-            "/index.js"
-        ]
-        for fname in to_copy:
-            shutil.copyfile(youclidbackend.__path__[0] + "/data" + fname, path+fname)
-
     return html
 
 
-if __name__ == "__main__":
+def write_html(f, json_object, final, packed=False, compact=False,
+               links=None):
+    """Write the page for the compiled document to the file object f, a
+    piece of the template at a time (see generate_html()). If compact is
+    set, the JSON isn't indented, and links are the names of the previous
+    and next documents of a site (see build()), if there are any."""
+    for i, piece in enumerate(_template_segments()):
+        if i % 2 == 0:
+            f.write(piece)
+        elif piece == 'json':
+            if packed:
+                json.dump(payload.pack(json_object), f,
+                          separators=(',', ':'))
+            elif compact:
+                json.dump(json_object, f, separators=(',', ':'))
+            else:
+                json.dump(json_object, f, indent=4)
+        elif piece == 'text':
+            f.write(json_object['text'].replace("\n", "<br>\n        "))
+        elif piece == 'links':
+            if links is not None:
+                f.write(navigation(*links))
+        elif final:
+            f.write(assets.names()[piece])
+        else:
+            f.write(youclidbackend.__path__[0] + "/data/" + piece)
+
+
+def navigation(previous=None, next=None):
+    """The links from a page of a site to the pages of the documents around
+    it, and to the list of all of them"""
+    links = []
+    if previous is not None:
+        links.append('<a href="%s">&larr; %s</a>' %
+                     (_href(previous), escape(previous)))
+    links.append('<a href="index.html">Contents</a>')
+    if next is not None:
+        links.append('<a href="%s">%s &rarr;</a>' %
+                     (_href(next), escape(next)))
+    return '<div id="links">%s</div>' % " | ".join(links)
+
+
+def write_index(output, names):
+    """Write the page of a site that lists all of its documents, by the
+    names of their pages without .html, to index.html in output"""
+    items = "".join('\n      <li><a href="%s">%s</a></li>' %
+                    (_href(name), escape(name)) for name in names)
+    with open(os.path.join(output, "index.html"), 'w') as f:
+        f.write(_INDEX % (assets.names()['styles/default.css'], items))
+
+
+def _href(name):
+    return escape(urllib.parse.quote(name + ".html"))
+
+
+_INDEX = """<!DOCTYPE html>
+<html>
+  <head>
+    <meta charset=utf-8>
+    <meta name="viewport" content="width=device-width,initial-scale=1">
+    <title>YouClid</title>
+    <link rel="stylesheet" href="%s">
+  </head>
+  <body>
+    <div id="text">
+      <ul>%s
+      </ul>
+    </div>
+  </body>
+</html>
+"""
+
+
+def copy_assets(path, store=None):
+    """Put the styles and scripts that the final HTML needs in path, under
+    the names that the HTML refers to them by, linked from store (see
+    assets.py)"""
+    return assets.publish(path, store)
+
+
+def build(directory, output, jobs=None, context=None, packed=False,
+          store=None):
+    """Compile every .yc file in directory to a page in the output directory,
+    using a pool of jobs processes, and link the pages together in the order
+    of their file names, with an index.html that lists them (so there can't
+    be an index.yc). The styles and scripts are copied to the output
+    directory once, for all of the pages to share, from the asset store if
+    one is given (see assets.publish()). Each file is compiled in a fresh
+    copy of the context, if one is given, and packed is passed on to
+    write_html().
+
+    Only the files that changed since the last build into the output
+    directory are compiled, along with the ones next to files that were
+    added or removed (see manifest.py). The pages of files that are gone, or
+    that don't compile any more, are removed, and the pages next to them
+    link past them.
+
+    Returns a list of (path, seconds, success) tuples, one for each file,
+    where seconds is None for the files whose pages were up to date.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "*.yc")))
+    os.makedirs(output, exist_ok=True)
+    copy_assets(output, store)
+
+    compiled = {}
+    sources = []
+    for path in paths:
+        if _page_name(path) == "index":
+            print_error(CompileError("Reserved name",
+                                     "index.html is the list of pages, so "
+                                     "this needs another name"), path=path)
+            compiled[path] = (path, 0.0, False)
+        else:
+            sources.append(path)
+
+    old = manifest.load(output)
+    build_options = manifest.options(context, packed)
+    removed = {entry['page'] for entry in
+               (old or {}).get('documents', {}).values()}
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        # Files that fail change the links of the pages next to them, so
+        # those are compiled again, until everything that is left compiles
+        while True:
+            new = manifest.create(sources, build_options)
+            documents = new['documents']
+            stale = [p for p in sources if os.path.basename(p) in
+                     set(manifest.stale(old, new, output))]
+            links = [(documents[os.path.basename(p)]['previous'],
+                      documents[os.path.basename(p)]['next']) for p in stale]
+            failed = set()
+            for result in pool.map(_build_file, stale,
+                                   itertools.repeat(output),
+                                   itertools.repeat(context),
+                                   itertools.repeat(packed), links):
+                path, seconds, success = compiled[result[0]] = result
+                if not success:
+                    failed.add(path)
+                    del documents[os.path.basename(path)]
+            old = new
+            if not failed:
+                break
+            sources = [p for p in sources if p not in failed]
+
+    removed -= {entry['page'] for entry in documents.values()}
+    removed.update(_page_name(p) + ".html" for p in compiled
+                   if not compiled[p][2] and _page_name(p) != "index")
+    for page in removed:
+        try:
+            os.remove(os.path.join(output, page))
+        except OSError:
+            pass
+    write_index(output, [_page_name(p) for p in sources])
+    manifest.store(output, new)
+    return [compiled.get(path, (path, None, True)) for path in paths]
+
+
+def _page_name(path):
+    """The name of the page of the .yc file at path, without .html"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _build_file(path, output, context=None, packed=False, links=None):
+    """Compile a single file for build(), in a worker process. Returns
+    (path, seconds, success), and doesn't raise."""
+    start = time.perf_counter()
+    name = _page_name(path)
+    try:
+        with open(path) as f:
+            json_object = parse(f, context and context.fresh())
+        with open(os.path.join(output, name + ".html"), 'w') as f:
+            write_html(f, json_object, True, packed, links=links)
+    except CompileError as e:
+        print_error(e, path=path)
+        return path, time.perf_counter() - start, False
+    except Exception as e:
+        # A bug in the compiler shouldn't stop the other files from being
+        # built
+        print_error(CompileError("Internal error",
+                                 "%s: %s" % (type(e).__name__, e)), path=path)
+        return path, time.perf_counter() - start, False
+    return path, time.perf_counter() - start, True
+
+
+def write_distribution(json_object, output, packed=False):
+    """Write the compiled document to the output path as a single minified
+    page, with compressed copies of it next to it (see distribution.py).
+    Returns the size of the page and assets that final would have written
+    and the paths and sizes of the files that were written instead."""
+    html = io.StringIO()
+    write_html(html, json_object, True, packed)
+    before = distribution.unbundled_size(html.getvalue())
+    html = io.StringIO()
+    write_html(html, json_object, True, packed, compact=True)
+    return before, distribution.write(html.getvalue(), output)
+
+
+def write_output(json_object, output=None, final=False, packed=False,
+                 dist=False):
+    """Write the compiled document to the output path as HTML (a directory
+    if final is set, and a single minified page if dist is), or print it as
+    JSON if there is no output path. If packed is set, the geometry is
+    packed into typed arrays either way."""
+    if output and dist:
+        before, written = write_distribution(json_object, output, packed)
+        for line in distribution.report(before, written):
+            print(line, file=sys.stderr)
+    elif(output and not final):
+        with open(output, "w") as f:
+            write_html(f, json_object, final, packed)
+    elif(output and final):
+        generate_html(json_object, final, path=output, packed=packed)
+    elif packed:
+        print(json.dumps(payload.pack(json_object)))
+    else:
+        print(json.dumps(json_object, indent=4))
+
+
+def write_profile(context, profile=None, graph=None):
+    """Write the solver's report for the compile in the context as JSON to
+    the profile path, and its constraint graph to the graph path, for the
+    paths that are given"""
+    if profile and context.profile is not None:
+        context.profile.write(profile)
+    if graph:
+        with open(graph, 'w') as f:
+            f.write(constraint_graph(context))
+
+
+def watch(path, output=None, final=False, interval=0.5, context=None,
+          profile=None, graph=None, packed=False, dist=False):
+    """Compile path to output, and then again every time that it changes,
+    until interrupted. Every compile after the first one only redoes the
+    work for what changed since the previous one. The first compile uses a
+    fresh copy of the context, if one is given. The profile and graph of
+    each compile are written like write_profile() does, and packed and dist
+    are passed on to write_output()."""
+    document = None
+    mtime = None
+    while True:
+        try:
+            current = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            # Some editors save by replacing the file, so just wait for it
+            current = mtime
+        if current != mtime:
+            mtime = current
+            start = time.perf_counter()
+            with open(path) as f:
+                text = f.read()
+            try:
+                if document is None:
+                    document = youclidbackend.incremental.compile_document(
+                        text, context and context.fresh())
+                else:
+                    document = youclidbackend.incremental.update(document,
+                                                                 text)
+                write_output(document.output, output, final, packed, dist)
+                write_profile(document.context, profile, graph)
+            except CompileError as e:
+                print_error(e)
+            else:
+                print("Compiled %s in %.3f seconds" %
+                      (path, time.perf_counter() - start), file=sys.stderr)
+        time.sleep(interval)
+
+
+def main(argv=None):
+    global error_color
+
     parser = argparse.ArgumentParser(
         description="Generate html from .yc files")
-    parser.add_argument("path", type=str, help="Path to .yc file")
+    parser.add_argument("path", type=str,
+                        help="Path to .yc file, or to a directory of them")
     parser.add_argument("-o",
                         "--output",
                         type=str,
@@ -852,19 +1920,118 @@ if __name__ == "__main__":
                         "--nocolor",
                         help="If present, don't output errors in color",
                         action='store_false')
-    args = parser.parse_args()
+    parser.add_argument("-w",
+                        "--watch",
+                        help="If present, keep running and recompile every "
+                             "time that the file is saved",
+                        action='store_true')
+    parser.add_argument("-j",
+                        "--jobs",
+                        type=int,
+                        help="Number of processes to compile a directory "
+                             "with (the number of CPUs by default), or to "
+                             "place the parts of a figure that don't share "
+                             "any points with (one by default)")
+    parser.add_argument("-s",
+                        "--seed",
+                        type=int,
+                        help="Seed for placing the points that can go "
+                             "anywhere, so that the figure comes out the same "
+                             "every time")
+    parser.add_argument("--candidates",
+                        type=int,
+                        default=1,
+                        help="Number of random layouts to try at once, "
+                             "keeping the one where the points are the most "
+                             "spread out (needs numpy)")
+    parser.add_argument("--cache",
+                        type=str,
+                        default=placement.default_directory(),
+                        help="Directory to remember where points were placed "
+                             "in, so that a figure that didn't change isn't "
+                             "placed again (%(default)s by default)")
+    parser.add_argument("--no-cache",
+                        help="If present, don't use the placement cache",
+                        action='store_true')
+    parser.add_argument("--packed",
+                        help="If present, put the geometry in the page as "
+                             "binary arrays instead of JSON, which makes the "
+                             "pages of big figures a lot smaller",
+                        action='store_true')
+    parser.add_argument("--dist",
+                        help="If present, output the HTML for distribution "
+                             "as a single minified file, with compressed "
+                             "copies of it for a server to send",
+                        action='store_true')
+    parser.add_argument("--profile",
+                        type=str,
+                        help="Path to write a JSON report of how each point "
+                             "was placed and how long it took to")
+    parser.add_argument("--graph",
+                        type=str,
+                        help="Path to write the graph of the objects and "
+                             "what they depend on to, for Graphviz")
+    parser.add_argument("--exact",
+                        help="If present, place points with exact (symbolic) "
+                             "arithmetic, which is a lot slower",
+                        action='store_true')
+    args = parser.parse_args(argv)
     error_color = args.nocolor
+    if args.dist and not args.output:
+        parser.error("--dist needs an output path")
+    context = Context(args.seed, collect_errors=True, exact=args.exact,
+                      cache=None if args.no_cache else args.cache,
+                      candidates=args.candidates,
+                      profile=args.profile is not None,
+                      jobs=1 if os.path.isdir(args.path) else args.jobs or 1)
+
+    if os.path.isdir(args.path):
+        if not args.output:
+            parser.error("an output directory is needed to compile a "
+                         "directory")
+        if args.profile or args.graph or args.dist:
+            parser.error("--profile, --graph and --dist only work on a "
+                         "single file")
+        start = time.perf_counter()
+        results = build(args.path, args.output, args.jobs, context,
+                        args.packed)
+        for path, seconds, success in results:
+            if seconds is None:
+                print("%-40s %9s" % (path, "unchanged"))
+            else:
+                print("%-40s %8.3fs%s" % (path, seconds,
+                                          "" if success else "  failed"))
+        print("Compiled %d of %d files in %.3f seconds" %
+              (sum(seconds is not None for path, seconds, success in results),
+               len(results), time.perf_counter() - start))
+        if not all(success for path, seconds, success in results):
+            sys.exit(1)
+        return
+
+    if args.watch:
+        try:
+            watch(args.path, args.output, args.final, context=context,
+                  profile=args.profile, graph=args.graph,
+                  packed=args.packed, dist=args.dist)
+        except KeyboardInterrupt:
+            pass
+        return
 
-    with open(args.path) as f:
-        text = f.read()
+    try:
+        with open(args.path) as f:
+            json_object = parse(f, context)
+    except CompileError as e:
+        print_error(e)
+        sys.exit(1)
 
-    json_object = parse(text)
+    write_output(json_object, args.output, args.final, args.packed,
+                 args.dist)
+    write_profile(context, args.profile, args.graph)
 
-    if(args.output and not args.final):
-        with open(args.output, "w") as f:
-            f.write(generate_html(json_object, args.final))
-    elif(args.output and args.final):
-        os.makedirs(args.output + "/styles", exist_ok=True)
-        generate_html(json_object, args.final, path=args.output)
-    else:
-        print(json.dumps(json_object, indent=4))
+
+if __name__ == "__main__":
+    # When run as a script, this file is a different module from the one in
+    # the package that the other modules use. Run that one instead, so that
+    # there is only one set of globals.
+    from youclidbackend import main_parser
+    main_parser.main()
@@ -0,0 +1,117 @@
+"""What a directory build (main_parser.build()) wrote last time.
+
+The output directory keeps a manifest.json of the build that wrote it: a
+fingerprint of the compiler (the package's code, the template, and the
+styles and scripts that pages refer to), the options that change what the
+pages look like, and for every document the hash of its source and the
+documents before and after it, which its page links to. Building into the
+same directory again only compiles the documents whose entries changed:
+
+    {"version": 1,
+     "compiler": "3f2a...",
+     "options": {"seed": "0", "exact": false, "candidates": 1,
+                 "packed": false},
+     "documents": {"proposition6.yc": {"source": "9c04...",
+                                       "page": "proposition6.html",
+                                       "previous": "postulate-2",
+                                       "next": null}}}
+
+If the compiler or the options changed, every document is compiled again.
+Documents that failed to compile are left out, and the pages around them
+link past them, so they are tried again next time.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from youclidbackend import assets
+
+# Change this if what is stored, or how it is used, changes
+VERSION = 1
+NAME = "manifest.json"
+
+_compiler = None
+
+
+def compiler():
+    """The hash of everything that goes into a page other than its document,
+    worked out once"""
+    global _compiler
+    if _compiler is None:
+        package = os.path.dirname(os.path.abspath(__file__))
+        paths = [os.path.join(package, "data", "template.html")]
+        for directory, subdirectories, files in os.walk(package):
+            # The tests don't change what the pages look like, and the
+            # template and the assets in data are hashed on their own
+            subdirectories[:] = [d for d in subdirectories
+                                 if d not in ("tests", "data", "__pycache__")]
+            paths.extend(os.path.join(directory, f) for f in files
+                         if f.endswith(".py"))
+        digest = hashlib.sha256()
+        for path in sorted(paths):
+            digest.update(os.path.relpath(path, package).encode())
+            digest.update(_hash(path).encode())
+        digest.update(json.dumps(assets.names(), sort_keys=True).encode())
+        _compiler = digest.hexdigest()
+    return _compiler
+
+
+def options(context=None, packed=False):
+    """The build options that change what the pages look like"""
+    return {'seed': repr(context.seed) if context else None,
+            'exact': bool(context and context.exact),
+            'candidates': context.candidates if context else 1,
+            'packed': packed}
+
+
+def create(paths, build_options):
+    """The manifest for building the documents at paths, in that order, with
+    the options from options()"""
+    names = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    documents = {}
+    for i, path in enumerate(paths):
+        documents[os.path.basename(path)] = {
+            'source': _hash(path),
+            'page': names[i] + ".html",
+            'previous': names[i - 1] if i > 0 else None,
+            'next': names[i + 1] if i + 1 < len(names) else None}
+    return {'version': VERSION,
+            'compiler': compiler(),
+            'options': build_options,
+            'documents': documents}
+
+
+def stale(old, new, output):
+    """The names of the documents in the manifest new that have to be
+    compiled into output, given that the manifest old was there"""
+    if old is None or any(old.get(k) != new[k]
+                          for k in ('version', 'compiler', 'options')):
+        return list(new['documents'])
+    return [name for name, entry in new['documents'].items()
+            if old['documents'].get(name) != entry or
+            not os.path.exists(os.path.join(output, entry['page']))]
+
+
+def load(output):
+    """The manifest in output, or None if there isn't one that can be read"""
+    try:
+        with open(os.path.join(output, NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store(output, manifest):
+    path = os.path.join(output, NAME)
+    # Write it somewhere else first, so that a build that is interrupted
+    # never leaves half of it
+    fd, tmp = tempfile.mkstemp(dir=output, suffix=".tmp")
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
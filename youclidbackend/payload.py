@@ -0,0 +1,90 @@
+"""The compiled geometry as typed arrays, for pages of big figures.
+
+main_parser.create_output() gives every object a dictionary of its own, and
+as JSON every coordinate of those takes about twenty characters. pack()
+turns the same thing into a few arrays instead, which are base64 encoded
+binary, and which unpackGeometry() in index.js turns back into what
+create_output() returned when the page loads:
+
+    names    the name of every object, points first
+    types    Uint8Array, the index of each object's type in TYPES
+    colors   Float32Array, the RGBA color of each object
+    coords   Float32Array, the x and y of each point (NaN if it has none)
+    values   Float32Array, the radius of each circle and the degree of each
+             angle (NaN for everything else, and for circles whose radius
+             isn't known)
+    offsets  Uint32Array, where the references of each object start in refs
+    refs     Uint32Array, the indices of the points that each object refers
+             to, in the order of REFERENCES (NONE where there isn't one)
+
+The animations are lists of object indices. The text of the document isn't
+included, since the page has it already.
+"""
+import array
+import base64
+import sys
+
+# Bump this when the format changes, along with unpackGeometry()
+VERSION = 1
+
+TYPES = ['Point', 'Line', 'Circle', 'Polygon', 'Angle']
+# The points that each type of object refers to, from its data
+REFERENCES = {'Point': [],
+              'Line': ['p1', 'p2'],
+              'Circle': ['p1', 'p2', 'p3', 'center'],
+              'Polygon': 'points',
+              'Angle': 'points'}
+NONE = 0xFFFFFFFF
+NAN = float('nan')
+
+
+def pack(json_object):
+    """The output of create_output() as typed arrays"""
+    objects = sorted(json_object['geometry'].values(),
+                     key=lambda o: o['type'] != 'Point')
+    index = {o['id']: i for i, o in enumerate(objects)}
+
+    types = array.array('B')
+    colors = array.array('f')
+    coords = array.array('f')
+    values = array.array('f')
+    offsets = array.array('I', [0])
+    refs = array.array('I')
+    for o in objects:
+        kind, data = o['type'], o['data']
+        types.append(TYPES.index(kind))
+        colors.extend(o['color'])
+        if kind == 'Point':
+            coords.extend(NAN if v is None else v
+                          for v in (data['x'], data['y']))
+
+        value = data.get('radius', data.get('degree'))
+        values.append(NAN if value is None else value)
+
+        names = REFERENCES[kind]
+        if isinstance(names, str):
+            points = data[names]
+        else:
+            points = [data[name] for name in names]
+        refs.extend(NONE if p is None else index[p] for p in points)
+        offsets.append(len(refs))
+
+    return {'packed': VERSION,
+            'names': [o['label'] for o in objects],
+            'types': _encode(types),
+            'colors': _encode(colors),
+            'coords': _encode(coords),
+            'values': _encode(values),
+            'offsets': _encode(offsets),
+            'refs': _encode(refs),
+            'animations': [[index[i] for i in step]
+                           for step in json_object['animations']]}
+
+
+def _encode(a):
+    # Typed arrays are in the byte order of the machine that the page is
+    # on, which is little endian for everything that runs a browser
+    if sys.byteorder == 'big':
+        a = array.array(a.typecode, a)
+        a.byteswap()
+    return base64.b64encode(a.tobytes()).decode('ascii')
@@ -0,0 +1,145 @@
+"""A cache of where the points of a figure were placed, on disk.
+
+The cache is keyed by a hash of how every point is defined: the objects that
+it is on or helps to define, and where it was put with loc. If a figure is
+compiled again without any of that changing, the points go back to where
+they were, without running the solver, so the figure doesn't move around
+between compiles either.
+
+The cache is only a speedup, so a directory that can't be written to just
+means that figures are placed again. It keeps at most MAX_ENTRIES figures,
+and forgets the ones that were used least recently first, since figures
+with points that can go anywhere get a new entry for every seed.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from youclidbackend import primitives
+
+# Change this if what is stored, or how it is used, changes
+VERSION = 2
+MAX_ENTRIES = 1000
+
+
+def default_directory():
+    """Where the cache is kept unless told otherwise"""
+    base = os.environ.get("XDG_CACHE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "youclid", "placements")
+
+
+def key(context):
+    """The hash of the figure in the context, before it has been placed"""
+    points = sorted((name, point_definition(p)[0])
+                    for name, p in context.obj_dict['point'].items())
+    figure = [VERSION, repr(context.seed), context.exact, context.candidates,
+              points]
+    return hashlib.sha256(json.dumps(figure).encode()).hexdigest()
+
+
+def load(context, directory, figure_key):
+    """Place the points in the context like they were last time. Returns
+    whether there was anything in the cache to do that with."""
+    path = os.path.join(directory, figure_key + ".json")
+    try:
+        with open(path) as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return False
+    points = context.obj_dict['point']
+    if set(stored['points']) != set(points):
+        return False
+
+    for name, (x, y) in stored['points'].items():
+        points[name].x, points[name].y = x, y
+    # Circles that go through points have the radius that the solver gave
+    # them (see main_parser._fix_radius())
+    for name, (center, point) in stored['radii'].items():
+        circle = context.obj_dict['circle'][name]
+        circle.radius = (points[center], points[point])
+    try:
+        # So that it is evicted last
+        os.utime(path)
+    except OSError:
+        pass
+    return True
+
+
+def store(context, directory, figure_key):
+    """Remember where the points in the context were placed, if the cache
+    can be written to"""
+    stored = {
+        'points': {name: [p.x, p.y]
+                   for name, p in context.obj_dict['point'].items()},
+        'radii': {name: [c.radius[0].name, c.radius[1].name]
+                  for name, c in context.obj_dict['circle'].items()
+                  if type(c.radius) is tuple and None not in c.radius}
+    }
+    path = os.path.join(directory, figure_key + ".json")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Write it somewhere else first, so that a compile running at the
+        # same time never reads half of it
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(stored, f)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        return
+    _evict(directory)
+
+
+def _evict(directory):
+    # Forget the figures that were used least recently, until there are at
+    # most MAX_ENTRIES of them
+    try:
+        entries = [entry for entry in os.scandir(directory)
+                   if entry.name.endswith(".json")]
+        if len(entries) <= MAX_ENTRIES:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - MAX_ENTRIES]:
+            os.unlink(entry.path)
+    except OSError:
+        # Another compile may have evicted them already
+        pass
+
+
+def point_definition(point):
+    """What a point is defined by, in terms of names only, and the names of
+    the other points that its position depends on"""
+    constraints = sorted((definition(c) for c in point.constraints), key=repr)
+    lies_on = sorted((definition(c) for c in point.lies_on), key=repr)
+    depends = {name for c in point.constraints
+               for name in definition(c)[2] if name is not None}
+    depends.discard(point.name)
+    return ((point.random, point.x, point.y, constraints, lies_on),
+            frozenset(depends))
+
+
+def definition(obj):
+    """The type, name and defining points of an object"""
+    radius = None
+    if isinstance(obj, primitives.Line):
+        points = [obj.p1, obj.p2]
+    elif isinstance(obj, primitives.Circle):
+        points = [obj.p1, obj.p2, obj.p3, obj.center]
+        if type(obj.radius) is tuple:
+            points.extend(obj.radius)
+        else:
+            radius = obj.radius
+    elif isinstance(obj, primitives.Polygon):
+        points = obj.points
+    else:
+        points = []
+    names = tuple(p.name if p is not None else None for p in points)
+    return (obj.__class__.__name__, str(obj.name), names, str(radius))
@@ -4,7 +4,9 @@ from youclidbackend.primitives import YouClidObject
 
 class Angle(YouClidObject):
     """Represents an Angle"""
-    def __init__(self, name):
+    __slots__ = ('p1', 'p2', 'p3', 'big', 'degree')
+
+    def __init__(self, name, color=None):
         super().__init__()
         self.name = name
         self.p1 = None
@@ -12,7 +14,9 @@ class Angle(YouClidObject):
         self.p3 = None
         self.big = False
         self.degree = None
-        self.color = youclidbackend.colors.next_color()
+        if color is None:
+            color = youclidbackend.colors.next_color()
+        self.color = color
 
     def __str__(self):
         return "Angle %s(%s, %s, %s)" % (str(self.name),
@@ -26,15 +30,9 @@ class Angle(YouClidObject):
                                          str(self.p2),
                                          str(self.p3))
 
-    def __eq__(self, other):
-        if isinstance(other, Angle):
-            return (self.p1 == other.p1 and self.p2 == other.p2 and
-                    self.p3 == other.p3)
-        else:
-            return False
-
-    def __hash__(self):
-        return hash(str(self))
+    def same_as(self, other):
+        return (isinstance(other, Angle) and self.p1.same_as(other.p1) and
+                self.p2.same_as(other.p2) and self.p3.same_as(other.p3))
 
     def __dict__(self):
         return {
@@ -2,12 +2,15 @@ import sympy
 import random
 import math
 import youclidbackend.colors
+from youclidbackend import geometry
 from youclidbackend.primitives import YouClidObject
 
 
 class Circle(YouClidObject):
     """Represents a circle in 2D"""
-    def __init__(self, name):
+    __slots__ = ('p1', 'p2', 'p3', 'center', 'radius')
+
+    def __init__(self, name, color=None):
         super().__init__()
         self.name = name
         self.p1 = None
@@ -15,7 +18,9 @@ class Circle(YouClidObject):
         self.p3 = None
         self.center = None
         self.radius = None
-        self.color = youclidbackend.colors.next_color()
+        if color is None:
+            color = youclidbackend.colors.next_color()
+        self.color = color
 
     def __str__(self):
         return "Circle %s(%s, %s, %s)" % (str(self.name),
@@ -29,54 +34,66 @@ class Circle(YouClidObject):
                                           str(self.p2),
                                           str(self.p3))
 
-    def __eq__(self, other):
-        if isinstance(other, Circle):
-            mypoints = [self.p1, self.p2, self.p3]
-            otherpoints = [other.p1, other.p2, other.p3]
-            return (all([x in otherpoints for x in mypoints]) and
-                    all([x in mypoints for x in otherpoints]))
-        else:
+    def same_as(self, other):
+        if not isinstance(other, Circle):
             return False
-
-    def __hash__(self):
-        return hash(str(self))
+        mine = [self.p1, self.p2, self.p3]
+        theirs = [other.p1, other.p2, other.p3]
+        return (all(_any_same(p, theirs) for p in mine) and
+                all(_any_same(p, mine) for p in theirs))
 
     def __dict__(self):
         return {
                 'p1': "point_"+self.p1.name if self.p1 is not None else None,
                 'p2': "point_"+self.p2.name if self.p2 is not None else None,
                 'p3': "point_"+self.p3.name if self.p3 is not None else None,
-                'radius': self.radius_length() if self.radius is not None else None,
+                'radius': self.radius_length() if self._radius_placed() else None,
                 'center': "point_"+self.center.name if self.center is not None else None
                }
 
     def radius_length(self):
         return self.radius[0].dist(self.radius[1]) if type(self.radius) is tuple else self.radius
 
-    def arbitrary_point(self):
+    def arbitrary_point(self, rng=random):
         """Compute an arbitrary point on the circle"""
-        tmp = self.symify().arbitrary_point()
-        t = sympy.Symbol('t', real=True)
-        r = random.uniform(0, 2*math.pi)
-        arbitrary_point = sympy.Point(tmp.x.subs(t, r),
-                                      tmp.y.subs(t, r))
-
-        # Convert the cordinates to floats and then assign them
-        return (float(arbitrary_point.x), float(arbitrary_point.y))
+        (x, y), radius = self.numify()
+        t = rng.uniform(0, 2*math.pi)
+        return (x + radius * math.cos(t), y + radius * math.sin(t))
 
     def symify(self):
-        # TODO: Implicityly assuming that the center is given coordaintes.
-        if self.radius is None:
-            if self.p1.x is not None:
-                self.radius = (self.center, self.p1)
-            elif self.p2.x is not None:
-                self.radius = (self.center, self.p2)
-            elif self.p3.x is not None:
-                self.radius = (self.center, self.p3)
-            else:
-                return None
-
-        # TODO: Should this check go first?
-        if self.center.x is None:
+        if not self._placed():
+            return None
+        return self._cached('sympy', self._key(),
+                            lambda: sympy.Circle(self.center.symify(),
+                                                 self.radius_length()))
+
+    def numify(self):
+        if not self._placed():
             return None
-        return sympy.Circle(self.center.symify(), self.radius_length())
+        return self._cached('float', self._key(),
+                            lambda: geometry.Circle(self.center.numify(),
+                                                    self.radius_length()))
+
+    def _key(self):
+        return (self.center.x, self.center.y, self.radius_length())
+
+    def _placed(self):
+        """Whether the circle has a center and radius yet (with both ends
+        placed, for a radius between two points). Circles that go
+        through points are given their radius by the solver, when the first
+        of those points is placed (see main_parser._fix_radius())."""
+        # TODO: Implicityly assuming that the center is given coordaintes.
+        return self._radius_placed() and self.center.x is not None
+
+    def _radius_placed(self):
+        if type(self.radius) is tuple:
+            # A radius like AB needs both of its ends
+            return all(p is not None and p.x is not None
+                       for p in self.radius)
+        return self.radius is not None
+
+
+def _any_same(point, points):
+    if point is None:
+        return any(p is None for p in points)
+    return any(p is not None and point.same_as(p) for p in points)
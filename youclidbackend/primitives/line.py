@@ -2,18 +2,23 @@ import sympy
 import math
 import random
 import youclidbackend.colors
+from youclidbackend import geometry
 from youclidbackend.primitives import YouClidObject
 from youclidbackend.utils import lerp
 
 
 class Line(YouClidObject):
     """Represents a line in 2D"""
-    def __init__(self, name):
+    __slots__ = ('p1', 'p2', 'constraints')
+
+    def __init__(self, name, color=None):
         super().__init__()
         self.p1 = None
         self.p2 = None
         self.name = name
-        self.color = youclidbackend.colors.next_color()
+        if color is None:
+            color = youclidbackend.colors.next_color()
+        self.color = color
         self.constraints = set()
 
     def __str__(self):
@@ -26,15 +31,12 @@ class Line(YouClidObject):
                                     str(self.p1),
                                     str(self.p2))
 
-    def __eq__(self, other):
-        if isinstance(other, Line):
-            return ((self.p1 == other.p1 or self.p1 == other.p2) and
-                    (self.p2 == other.p2 or self.p2 == other.p1))
-        else:
-            return False
-
-    def __hash__(self):
-        return hash(str(self))
+    def same_as(self, other):
+        if not isinstance(other, Line) or \
+                None in (self.p1, self.p2, other.p1, other.p2):
+            return self is other
+        return ((self.p1.same_as(other.p1) and self.p2.same_as(other.p2)) or
+                (self.p1.same_as(other.p2) and self.p2.same_as(other.p1)))
 
     def __dict__(self):
         return {
@@ -50,8 +52,8 @@ class Line(YouClidObject):
             return math.sqrt((self.p2.x - self.p1.x)**2 +
                              (self.p2.y - self.p1.y)**2)
 
-    def arbitrary_point(self):
-        t = random.uniform(0.2, 0.8)  # Add a pad so its not too close to endpoints
+    def arbitrary_point(self, rng=random):
+        t = rng.uniform(0.2, 0.8)  # Add a pad so its not too close to endpoints
         nx = lerp(self.p1.x, self.p2.x, t)
         ny = lerp(self.p1.y, self.p2.y, t)
 
@@ -60,8 +62,16 @@ class Line(YouClidObject):
     def symify(self):
         if self.p1.x is None or self.p2.x is None:
             return None
-        sym_p1 = self.p1.symify()
-        sym_p2 = self.p2.symify()
-        if sym_p1 is None or sym_p2 is None:
+        return self._cached('sympy', self._key(),
+                            lambda: sympy.Segment(self.p1.symify(),
+                                                  self.p2.symify()))
+
+    def numify(self):
+        if self.p1.x is None or self.p2.x is None:
             return None
-        return sympy.Segment(sym_p1, sym_p2)
+        return self._cached('float', self._key(),
+                            lambda: geometry.Segment(self.p1.numify(),
+                                                     self.p2.numify()))
+
+    def _key(self):
+        return (self.p1.x, self.p1.y, self.p2.x, self.p2.y)
@@ -1,21 +1,48 @@
 import math
 import sympy
 import youclidbackend.colors
+from youclidbackend.coordinates import CoordinateStore, NAN
 from youclidbackend.primitives import YouClidObject
 
 
 class Point(YouClidObject):
     """Represents a point object in 2D"""
-    def __init__(self, name):
+    __slots__ = ('store', 'index', 'random', 'constraints', 'lies_on')
+
+    def __init__(self, name, color=None, store=None):
         super().__init__()
-        self.x = None
-        self.y = None
+        # The coordinates are kept in the store of the document (or in one
+        # of the point's own), at the index
+        if store is None:
+            store = CoordinateStore()
+        self.store = store
+        self.index = store.add()
         self.random = False
         self.name = name
-        self.color = youclidbackend.colors.next_color()
+        if color is None:
+            color = youclidbackend.colors.next_color()
+        self.color = color
         self.constraints = set()
         self.lies_on = set()
 
+    @property
+    def x(self):
+        x = self.store.xs[self.index]
+        return None if math.isnan(x) else x
+
+    @x.setter
+    def x(self, value):
+        self.store.xs[self.index] = NAN if value is None else value
+
+    @property
+    def y(self):
+        y = self.store.ys[self.index]
+        return None if math.isnan(y) else y
+
+    @y.setter
+    def y(self, value):
+        self.store.ys[self.index] = NAN if value is None else value
+
     def __str__(self):
         return "Point %s(%s, %s)" % (str(self.name),
                                      str(self.x),
@@ -26,14 +53,9 @@ class Point(YouClidObject):
                                      str(self.x),
                                      str(self.y))
 
-    def __eq__(self, other):
-        if isinstance(other, Point):
-            return self.x == other.x and self.y == other.y
-        else:
-            return False
-
-    def __hash__(self):
-        return hash(str(self))
+    def same_as(self, other):
+        return (isinstance(other, Point) and
+                self.x == other.x and self.y == other.y)
 
     def __dict__(self):
         return {
@@ -47,4 +69,11 @@ class Point(YouClidObject):
     def symify(self):
         if self.x is None:
             return None
-        return sympy.Point(self.x, self.y)
+        return self._cached('sympy', (self.x, self.y),
+                            lambda: sympy.Point(self.x, self.y))
+
+    def numify(self):
+        if self.x is None:
+            return None
+        return self._cached('float', (self.x, self.y),
+                            lambda: (self.x, self.y))
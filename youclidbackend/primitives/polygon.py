@@ -1,15 +1,22 @@
 import sympy
+import random
 import youclidbackend.colors
+from youclidbackend import geometry
 from youclidbackend.primitives import YouClidObject
+from youclidbackend.utils import lerp
 
 
 class Polygon(YouClidObject):
     """Represents a triangle in 2D"""
-    def __init__(self, name):
+    __slots__ = ('points',)
+
+    def __init__(self, name, color=None):
         super().__init__()
         self.name = name
         self.points = None
-        self.color = youclidbackend.colors.next_color()
+        if color is None:
+            color = youclidbackend.colors.next_color()
+        self.color = color
 
     def __str__(self):
         ret = "Polygon %s(" % (str(self.name))
@@ -25,21 +32,36 @@ class Polygon(YouClidObject):
         p = ', '.join(str(x) for x in self.points)
         return "Polygon %s(%s)" % (str(self.name), p)
 
-    def __eq__(self, other):
-        if isinstance(other, Polygon):
-            return self.points == other.points
-        else:
-            return False
-
-    def __hash__(self):
-        return hash(str(self))
+    def same_as(self, other):
+        return (isinstance(other, Polygon) and
+                len(self.points) == len(other.points) and
+                all(p.same_as(q) for p, q in zip(self.points, other.points)))
 
     def __dict__(self):
         ret_dict = {}
         ret_dict["points"] = ["point_"+x.name for x in self.points]
         return ret_dict
 
+    def arbitrary_point(self, rng=random):
+        """Compute an arbitrary point on one of the edges"""
+        edges = geometry.edges(self.numify())
+        p1, p2 = edges[rng.randrange(len(edges))]
+        t = rng.uniform(0.2, 0.8)  # Add a pad so its not too close to corners
+        return (lerp(p1[0], p2[0], t), lerp(p1[1], p2[1], t))
+
     def symify(self):
         if any([True if x.x is None else False for x in self.points]):
             return None
-        return sympy.Polygon([x.symify() for x in self.points])
+        return self._cached('sympy', self._key(),
+                            lambda: sympy.Polygon(*[x.symify()
+                                                    for x in self.points]))
+
+    def numify(self):
+        if any(x.x is None for x in self.points):
+            return None
+        return self._cached('float', self._key(),
+                            lambda: geometry.Polygon([x.numify()
+                                                      for x in self.points]))
+
+    def _key(self):
+        return tuple((x.x, x.y) for x in self.points)
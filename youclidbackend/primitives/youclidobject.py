@@ -1,4 +1,35 @@
+import itertools
+
+# The ids of the objects, in the order that they were made in
+_ids = itertools.count()
+
+
 class YouClidObject:
+    """The base of every primitive. Objects are only equal to themselves and
+    hash by an id that they are given when they are made, so they can be
+    kept in sets and dicts while they are being placed. same_as() compares
+    what they are geometrically instead."""
+    __slots__ = ('id', 'name', 'color', '_cache')
 
     def __init__(self):
-        pass
+        self.id = next(_ids)
+        # What symify() and numify() last built, and the coordinates that
+        # they were built from
+        self._cache = {}
+
+    def __hash__(self):
+        return self.id
+
+    def same_as(self, other):
+        """Whether the other object is the same geometrically"""
+        raise NotImplementedError
+
+    def _cached(self, kind, key, build):
+        """Returns build(), unless it was already built from the same key
+        (the coordinates that it depends on)"""
+        cached = self._cache.get(kind)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        value = build()
+        self._cache[kind] = (key, value)
+        return value
@@ -0,0 +1,112 @@
+"""Where the solver spends its time, for figures that are slow to compile.
+
+    context = main_parser.Context(profile=True)
+    main_parser.parse(text, context)
+    context.profile.report()                # a dict, ready for json.dump()
+    main_parser.constraint_graph(context)   # the figure in Graphviz's format
+
+For every point, the profile records how it was placed (the branch of the
+solver that placed it), how many times it was looked at before everything
+that it is on could be placed, the time spent building the shapes that it is
+on (symify() or numify()) and intersecting them, and how many places where
+they meet were found.
+"""
+import contextlib
+import json
+import time
+
+# The branches of the solver, which is how each point can be placed:
+#   given         it had coordinates before the solver ran (loc, or from the
+#                 previous compile of an edited document)
+#   cache         from the placement cache
+#   random        random=true
+#   anywhere      it isn't on anything
+#   intersection  where the things that it is on meet
+#   arbitrary     somewhere on one of the things that it is on
+
+
+class Profile():
+    """What the solver did while placing the points of one compile"""
+    def __init__(self):
+        # The seconds that placing all of the points took
+        self.time = 0.0
+        # Whether the points came from the placement cache
+        self.cached = False
+        # How many times the points were placed (see Context.candidates)
+        self.layouts = 0
+        # What happened to each point, by name (in the layout that was kept,
+        # if more than one was tried)
+        self.points = {}
+
+    def point(self, p):
+        """The record for the point, which is added to as it is placed"""
+        record = self.points.get(p.name)
+        if record is None:
+            record = {'branch': None,
+                      'waited': 0,
+                      'shape_time': 0.0,
+                      'intersection_time': 0.0,
+                      'intersections': 0}
+            self.points[p.name] = record
+        return record
+
+    def placed(self, p, branch):
+        self.point(p)['branch'] = branch
+
+    def report(self):
+        """Everything that was recorded, as plain data"""
+        return {'time': self.time,
+                'cached': self.cached,
+                'layouts': self.layouts,
+                'points': self.points}
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=4, sort_keys=True)
+
+
+@contextlib.contextmanager
+def timed(record, key):
+    """Adds the seconds spent in the with block to record[key], if there is a
+    record"""
+    start = time.perf_counter()
+    yield
+    if record is not None:
+        record[key] += time.perf_counter() - start
+
+
+def dot(objects, edges, profile=None):
+    """The constraint graph in Graphviz's format. objects are (id, type,
+    name) for every object, and edges are (from id, to id, style), where the
+    style is 'on' for a point that is on an object and 'defines' for a point
+    that helps to define one. Points are annotated with what the profile
+    recorded about them."""
+    lines = ["digraph constraints {",
+             "    rankdir=LR;"]
+    for obj_id, kind, name in objects:
+        label = "%s %s" % (kind.lower(), name)
+        shape = "box"
+        if kind == 'Point':
+            shape = "ellipse"
+            record = profile.points.get(name) if profile is not None else None
+            if record is not None:
+                label += "\\n%s" % record['branch']
+                if record['waited']:
+                    label += ", waited %d" % record['waited']
+                if record['intersections']:
+                    label += ", %d found" % record['intersections']
+                label += "\\n%.3f ms" % (1000 * (record['shape_time'] +
+                                                 record['intersection_time']))
+        lines.append('    %s [shape=%s, label=%s];' %
+                     (_quote(obj_id), shape, _quote(label)))
+    for source, target, style in edges:
+        attributes = ' [style=dashed]' if style == 'defines' else ''
+        lines.append('    %s -> %s%s;' % (_quote(source), _quote(target),
+                                          attributes))
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def _quote(s):
+    # Escaped newlines in labels are kept as they are
+    return '"%s"' % s.replace('"', '\\"')
@@ -0,0 +1,173 @@
+import random
+import unittest
+
+import sympy
+
+from youclidbackend import coordinates, geometry, intersections, primitives
+
+
+def _sympify(entity):
+    if isinstance(entity, geometry.Segment):
+        return sympy.Segment(*entity)
+    elif isinstance(entity, geometry.Circle):
+        return sympy.Circle(entity.center, entity.radius)
+    return sympy.Polygon(*entity.points)
+
+
+class TestGeometry(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(0)
+
+    def point(self):
+        # Coordinates that are exact in binary, so that sympy works with the
+        # same numbers that we do
+        return (self.random.randint(-16, 16) / 8,
+                self.random.randint(-16, 16) / 8)
+
+    def segment(self):
+        return geometry.Segment(self.point(), self.point())
+
+    def circle(self):
+        return geometry.Circle(self.point(), self.random.randint(1, 16) / 8)
+
+    def triangle(self):
+        return geometry.Polygon([self.point() for i in range(3)])
+
+    def subtest_sympy(self, *entities):
+        """Check the intersection against the one that sympy finds"""
+        expected = sympy.intersection(*[_sympify(e) for e in entities])
+        expected = sorted((float(p.x), float(p.y)) for p in expected
+                          if isinstance(p, sympy.Point))
+        actual = geometry.intersection(*entities)
+        with self.subTest(entities=entities):
+            self.assertEqual(len(actual), len(expected))
+            for a, e in zip(actual, expected):
+                self.assertAlmostEqual(a[0], e[0], places=9)
+                self.assertAlmostEqual(a[1], e[1], places=9)
+
+    def test_against_sympy(self):
+        """The same points as sympy, for random shapes"""
+        for i in range(15):
+            self.subtest_sympy(self.segment(), self.segment())
+            self.subtest_sympy(self.segment(), self.circle())
+            self.subtest_sympy(self.circle(), self.circle())
+            self.subtest_sympy(self.circle(), self.segment(), self.segment())
+        for i in range(3):
+            self.subtest_sympy(self.triangle(), self.circle())
+            self.subtest_sympy(self.triangle(), self.segment())
+
+    def test_degenerate(self):
+        """Tangents, shared ends and overlaps"""
+        unit = geometry.Circle((0, 0), 1)
+        # Tangent to a segment, and to circles inside and outside
+        self.subtest_sympy(unit, geometry.Segment((-2, 1), (2, 1)))
+        self.subtest_sympy(unit, geometry.Circle((2, 0), 1))
+        self.subtest_sympy(unit, geometry.Circle((0.5, 0), 0.5))
+        # Segments that share an end, and that overlap
+        self.subtest_sympy(geometry.Segment((0, 0), (1, 0)),
+                           geometry.Segment((1, 0), (2, 0)))
+        self.assertEqual(geometry.intersection(
+            geometry.Segment((0, 0), (2, 0)),
+            geometry.Segment((1, 0), (3, 0))), [])
+        # The same circle twice
+        self.assertEqual(geometry.intersection(unit, unit), [])
+        # A corner of a polygon is only counted once
+        self.subtest_sympy(geometry.Polygon([(0, 0), (1, 0), (0, 1)]),
+                           geometry.Segment((-1, -1), (1, 1)))
+
+    def test_cached_shapes(self):
+        """Shapes are only built again when a point that they depend on
+        moves"""
+        a, b = primitives.Point("A"), primitives.Point("B")
+        line = primitives.Line("AB")
+        line.p1, line.p2 = a, b
+        self.assertIsNone(line.numify())
+        a.x, a.y, b.x, b.y = 0.0, 0.0, 1.0, 1.0
+        segment = line.numify()
+        self.assertIs(line.numify(), segment)
+        self.assertIs(line.symify(), line.symify())
+        b.x = 2.0
+        self.assertEqual(line.numify(), geometry.Segment((0.0, 0.0),
+                                                         (2.0, 1.0)))
+
+        # Building a shape doesn't change the object, even for a circle that
+        # doesn't have its radius yet
+        circle = primitives.Circle("ABB")
+        circle.center, circle.p1, circle.p2, circle.p3 = a, b, b, b
+        self.assertIsNone(circle.numify())
+        self.assertIsNone(circle.symify())
+        self.assertIsNone(circle.radius)
+
+    def test_arbitrary_point(self):
+        """Arbitrary points are on the shape that they were asked for"""
+        a, b, c = [primitives.Point(name) for name in "ABC"]
+        a.x, a.y, b.x, b.y, c.x, c.y = 0.0, 0.0, 1.0, 0.0, 0.0, 1.0
+        circle = primitives.Circle("c")
+        circle.center, circle.radius = a, 0.5
+        triangle = primitives.Polygon("ABC")
+        triangle.points = [a, b, c]
+        for i in range(20):
+            for obj in (circle, triangle):
+                point = obj.arbitrary_point(self.random)
+                self.assertTrue(geometry.contains(obj.numify(), point))
+
+    def test_intersection_cache(self):
+        """Shapes that are the same to within the tolerance share their
+        intersections, and the least recently used ones are dropped"""
+        cache = intersections.IntersectionCache(maxsize=2, tolerance=1e-6)
+        unit = geometry.Circle((0, 0), 1)
+        line = geometry.Segment((-2, 0), (2, 0))
+        key = cache.key(False, [unit, line])
+        self.assertIsNone(cache.get(key))
+        cache.put(key, ((-1.0, 0.0), (1.0, 0.0)))
+        nudged = geometry.Segment((-2, 1e-8), (2, 0))
+        self.assertEqual(cache.get(cache.key(False, [unit, nudged])),
+                         ((-1.0, 0.0), (1.0, 0.0)))
+        self.assertIsNone(cache.get(cache.key(True, [unit, line])))
+
+        cache.put(cache.key(False, [line, unit]), ())
+        cache.get(key)
+        cache.put(cache.key(False, [unit, unit]), ())
+        self.assertIsNotNone(cache.get(key))
+        self.assertIsNone(cache.get(cache.key(False, [line, unit])))
+        self.assertEqual(cache.stats(), {'size': 2, 'maxsize': 2, 'hits': 3,
+                                         'misses': 3, 'evictions': 1})
+
+    def test_identity(self):
+        """Objects stay in sets when they are placed, and are only equal to
+        themselves, but can be compared geometrically"""
+        a, b = primitives.Point("A"), primitives.Point("B")
+        self.assertNotEqual(a, b)
+        self.assertLess(a.id, b.id)
+        line = primitives.Line("AB")
+        line.p1, line.p2 = a, b
+        points = {a, b}
+        a.x, a.y, b.x, b.y = 0.0, 0.0, 1.0, 1.0
+        self.assertIn(a, points)
+        with self.assertRaises(AttributeError):
+            a.z = 0
+
+        other = primitives.Line("BA")
+        other.p1, other.p2 = primitives.Point("B"), primitives.Point("A")
+        other.p1.x, other.p1.y, other.p2.x, other.p2.y = 1.0, 1.0, 0.0, 0.0
+        self.assertNotEqual(line, other)
+        self.assertTrue(line.same_as(other))
+        self.assertTrue(a.same_as(other.p2))
+        self.assertFalse(a.same_as(b))
+
+    def test_coordinate_store(self):
+        """Points keep their coordinates in the store that they are made
+        with, where the ones that aren't placed are NaN"""
+        store = coordinates.CoordinateStore()
+        a = primitives.Point("A", store=store)
+        b = primitives.Point("B", store=store)
+        self.assertEqual((a.index, b.index, len(store)), (0, 1, 2))
+        self.assertIsNone(a.x)
+        b.x, b.y = 0.5, -0.25
+        self.assertEqual(store.tolist(), ([None, 0.5], [None, -0.25]))
+        self.assertEqual(bytes(store.xs)[8:], bytes(b.store.xs)[8:])
+        b.x = None
+        self.assertIsNone(b.x)
+        # A point on its own has a store of its own
+        self.assertEqual(len(primitives.Point("C").store), 1)
@@ -0,0 +1,80 @@
+import unittest
+
+from youclidbackend import incremental, main_parser
+
+
+class TestIncremental(unittest.TestCase):
+
+    text = ("Let [line AB] be a line, and [circle BCD] a circle.\n"
+            "[center A circle=BCD]\n"
+            "[step]\n"
+            "Then [point C] lies on it.\n"
+            "[loc A x=0 y=0]\n"
+            "[loc B x=0.5 y=0]\n")
+
+    def subtest_reparse(self, document, start, end, replacement):
+        """Check a reparse against compiling the edited text from scratch"""
+        new = document.text[:start] + replacement + document.text[end:]
+        try:
+            main_parser.parse(new)
+        except main_parser.CompileError:
+            with self.subTest(replacement=replacement):
+                with self.assertRaises(main_parser.CompileError):
+                    incremental.reparse(document, start, end, replacement)
+            return None
+        result = incremental.reparse(document, start, end, replacement)
+        with self.subTest(replacement=replacement):
+            self.assertEqual(result.text, new)
+            self.assertEqual([t for g in result.groups for t in g],
+                             main_parser.tokenize(new))
+            self.assertEqual(result.output['text'],
+                             main_parser.format_text(new))
+            self.assertCountEqual(result.output['geometry'],
+                                  main_parser.parse(new)['geometry'])
+        return result
+
+    def test_prose_edit(self):
+        """Editing only prose reuses the geometry"""
+        document = incremental.compile_document(self.text)
+        start = self.text.index("a line")
+        result = self.subtest_reparse(document, start, start + 1, "one\n")
+        self.assertIs(result.context.obj_dict, document.context.obj_dict)
+        self.assertEqual(result.output['geometry'],
+                         document.output['geometry'])
+
+        # Escaping a bracket turns markup into prose
+        start = result.text.index("[point C]")
+        result = self.subtest_reparse(result, start, start, "\\")
+        self.assertEqual(len(result.groups), len(document.groups) - 1)
+
+    def test_markup_edit(self):
+        """Points that didn't change keep their coordinates"""
+        document = incremental.compile_document(self.text)
+        start = self.text.index("[step]")
+        result = self.subtest_reparse(document, start, start,
+                                      "[point E] [line AE]")
+        self.assertIsNot(result.context.obj_dict, document.context.obj_dict)
+        for name in "BCD":
+            old = document.context.obj_dict['point'][name]
+            new = result.context.obj_dict['point'][name]
+            self.assertEqual((old.x, old.y), (new.x, new.y))
+
+        # Moving A moves the points that depend on it
+        start = result.text.index("[loc A x=0")
+        result = self.subtest_reparse(result, start + 9, start + 10, "0.1")
+        self.assertEqual(result.context.obj_dict['point']['A'].x, 0.1)
+        self.assertEqual(result.context.obj_dict['point']['B'].x, 0.5)
+
+    def test_boundary_edit(self):
+        """Edits right next to the brackets of a declaration scan it again"""
+        document = incremental.compile_document(self.text)
+        end = self.text.index("[line AB]") + len("[line AB]")
+        start = self.text.index("[circle BCD]")
+        for replacement in ("]", "x", " [point F]"):
+            self.subtest_reparse(document, end, end, replacement)
+        for replacement in ("[", "x", "[point F] "):
+            self.subtest_reparse(document, start, start, replacement)
+
+
+if __name__ == '__main__':
+    unittest.main()
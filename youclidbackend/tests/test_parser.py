@@ -1,4 +1,13 @@
+import array
+import base64
+import concurrent.futures
+import gzip
+import io
+import json
+import os
+import tempfile
 import unittest
+import unittest.mock
 
 import youclidbackend
 from youclidbackend import colors
@@ -67,6 +76,58 @@ class TestParser(unittest.TestCase):
         parse_list = ["[circle name=myname\]]"]
         self.subtest_extract(text, parse_list)
 
+    def test_tokenize(self):
+        """Ensure that the markup scanner agrees with the shlex tokenizer"""
+
+        texts = ["[point A]",
+                 "[point A][circle ABC]",
+                 "Some prose, it's [line AB text=\"side, AB\"] here",
+                 "\\[This should just be some text\\] [loc A x=0 y=.5]",
+                 "first line\n\n[angle name=angleABC\np1=A p2=B p3=C]",
+                 "[circle name=myname\\] ]",
+                 "[line AG text\"line GA\"]"]
+        basepath = youclidbackend.__path__[0] + "/data/texts/"
+        for fname in sorted(os.listdir(basepath)):
+            with open(basepath + fname) as f:
+                texts.append(f.read())
+
+        for text in texts:
+            tokens = youclidbackend.main_parser.tokenize(text)
+            with self.subTest(text=text[:40]):
+                self.assertEqual(
+                    [{'lineno': t['lineno'], 'data': t['data']}
+                     for t in tokens],
+                    youclidbackend.main_parser._shlex_tokenize(text))
+            # The offsets of each token point at its brackets
+            for t in tokens:
+                self.assertEqual(text[t['start']], '[')
+                self.assertEqual(text[t['end'] - 1], ']')
+
+        tokens = youclidbackend.main_parser.tokenize("a\n[point A]\n[loc A]")
+        self.assertEqual([t['lineno'] for t in tokens], [2, 3])
+
+    def test_streaming(self):
+        """Ensure that lines and file objects give the same result as text"""
+
+        text = "Prose [line AB\ntext=\"side AB\"] more prose\n" \
+               "[step] \\[not markup\\] [point\n\nC]\n" \
+               "[loc A x=0 y=0]\n"
+        tokens = youclidbackend.main_parser.tokenize(text)
+        html = youclidbackend.main_parser.format_text(text)
+        for source in (io.StringIO(text), text.splitlines(),
+                       text.splitlines(keepends=True)):
+            with self.subTest(source=source):
+                self.assertEqual(
+                    list(youclidbackend.main_parser.iter_tokens(source)),
+                    tokens)
+
+        # Lines without newlines are treated as if they were joined by them
+        for source in (io.StringIO(text), text.split('\n'),
+                       text.splitlines(keepends=True)):
+            with self.subTest(source=source):
+                self.assertEqual(
+                    youclidbackend.main_parser.format_text(source), html)
+
     def subtest_parse_match(self, text, kwargs):
         with self.subTest(text=text, kwargs=kwargs):
             parsed = youclidbackend.main_parser._parse_match(text)
@@ -855,29 +916,529 @@ class TestParser(unittest.TestCase):
     def test_parse_step(self):
         """Test the step parser function"""
 
-        # Reset the object dictionary
-        youclidbackend.main_parser.obj_dict = {}
+        context = youclidbackend.main_parser.Context()
 
         kwargs = {
                   'type': 'step'
                  }
         step = youclidbackend.main_parser._Step()
-        parser_output = youclidbackend.main_parser.parse_step(kwargs)
+        parser_output = youclidbackend.main_parser.parse_step(context, kwargs)
         self.subtest_count_equal(parser_output, [step])
 
     def test_parse_clear(self):
         """Test the clear parser function"""
 
-        # Reset the object dictionary
-        youclidbackend.main_parser.obj_dict = {}
+        context = youclidbackend.main_parser.Context()
 
         kwargs = {
                   'type': 'clear'
                  }
         clear = youclidbackend.main_parser._Clear()
-        parser_output = youclidbackend.main_parser.parse_clear(kwargs)
+        parser_output = youclidbackend.main_parser.parse_clear(context, kwargs)
         self.subtest_count_equal(parser_output, [clear])
 
+    def test_context(self):
+        """Compiles don't share any state, even when they run at once"""
+        text = ("[loc A x=0 y=0] [loc B x=0.5 y=0] [line AB] [circle BCD] "
+                "[center A circle=BCD] [step] [point E lieson=AB]\n")
+
+        def compile(seed):
+            context = youclidbackend.main_parser.Context(seed)
+            return youclidbackend.main_parser.parse(text, context)
+
+        first = compile(1)
+        self.assertEqual(first, compile(1))
+        self.assertEqual(first['geometry']['point_A']['color'],
+                         colors.DEFAULT[0])
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            outputs = list(executor.map(compile, [1] * 8))
+        for output in outputs:
+            self.assertEqual(output, first)
+
+    def test_symbols(self):
+        """Objects are declared once, and found by name or by type and name"""
+        context = youclidbackend.main_parser.Context()
+        point = context.get_or_create('point', 'A')
+        self.assertIs(context.get_or_create('point', 'A'), point)
+        self.assertIs(context.symbols.find('A'), point)
+        self.assertIs(context.symbols.find('point A'), point)
+        self.assertIsNone(context.symbols.find('point B'))
+
+        circle = context.create('circle', 'A')
+        self.assertIs(context.symbols.find('circle A'), circle)
+        with self.assertRaises(youclidbackend.main_parser.CompileError) as cm:
+            context.symbols.find('A', lineno=3)
+        self.assertEqual(cm.exception.name, "Ambiguous object")
+        self.assertEqual(cm.exception.lineno, 3)
+
+    def test_constrain(self):
+        """Points are placed after what they depend on, and cycles are
+        reported"""
+        main_parser = youclidbackend.main_parser
+        context = main_parser.Context(0)
+        main_parser.parse("[triangle ABC] [line BC] "
+                          "[circle c center=A radius=1] "
+                          "[point D lieson=c] [line AD] "
+                          "[point E lieson=AD] [point E lieson=BC]\n",
+                          context)
+        points = context.obj_dict['point']
+        self.assertAlmostEqual(points['A'].dist(points['D']), 1)
+        self.assertTrue(all(p.x is not None for p in points.values()))
+
+        with self.assertRaises(main_parser.CompileError) as cm:
+            main_parser.parse("[line AB] [line CD] [point A lieson=CD] "
+                              "[point C lieson=AB]\n")
+        self.assertEqual(cm.exception.msg.splitlines()[-1],
+                         "A is on Line CD, which needs C, which is on "
+                         "Line AB, which needs A")
+
+    def test_late_radius(self):
+        """A circle whose radius is between points that are placed after a
+        point on it isn't used to place that point"""
+        main_parser = youclidbackend.main_parser
+        text = ("[point A] [point B] [point C] [line XY] "
+                "[circle c center=C radius=AB] [point D lieson=XY] "
+                "[point D lieson=c] [line DX] [point A lieson=DX] "
+                "[point B lieson=DX]\n")
+        context = main_parser.Context(0)
+        output = main_parser.parse(text, context)
+        points = context.obj_dict['point']
+        self.assertAlmostEqual(output['geometry']['circle_c']['data']
+                               ['radius'], points['A'].dist(points['B']))
+
+    def test_placement_cache(self):
+        """A figure that didn't change is placed like it was last time,
+        without the solver"""
+        main_parser = youclidbackend.main_parser
+        text = ("Let [triangle ABC] be a triangle, [circle c center=A "
+                "radius=1] a circle and [point D lieson=c] a point on it\n")
+        with tempfile.TemporaryDirectory() as cache:
+            first = main_parser.parse(text, main_parser.Context(cache=cache))
+            with unittest.mock.patch.object(main_parser, 'constrain') as c:
+                second = main_parser.parse("Now " + text,
+                                           main_parser.Context(cache=cache))
+                self.assertFalse(c.called)
+            self.assertEqual(first['geometry'], second['geometry'])
+
+            # Moving a point places the figure again
+            third = main_parser.parse(text + "[loc A x=0 y=0]\n",
+                                      main_parser.Context(cache=cache))
+            self.assertNotEqual(first['geometry'], third['geometry'])
+
+            # The cache is best-effort, and bounded
+            with unittest.mock.patch.object(youclidbackend.placement,
+                                            'MAX_ENTRIES', 1):
+                main_parser.parse(text, main_parser.Context(1, cache=cache))
+            self.assertEqual(len(os.listdir(cache)), 1)
+            blocker = os.path.join(cache, "file")
+            with open(blocker, 'w'):
+                pass
+            main_parser.parse(text, main_parser.Context(
+                cache=os.path.join(blocker, "cache")))
+
+    @unittest.skipIf(youclidbackend.layout.numpy is None, "needs numpy")
+    def test_spread_layout(self):
+        """Trying more layouts keeps the most spread out one of them"""
+        main_parser = youclidbackend.main_parser
+        layout = youclidbackend.layout
+        # Points on top of each other, and a point on the edge, are worse
+        # than points that are apart
+        self.assertEqual(list(layout.score(
+            [[(0, 0), (0.5, 0.5)], [(0, 0), (0, 0.01)], [(0, 0), (1, 0.5)]],
+            [True, True]).argsort()), [1, 2, 0])
+
+        text = ("[triangle ABC] [circle c center=A radius=0.5] "
+                "[point D lieson=c] [point E] [point F random=true]\n")
+        scored = []
+
+        def score(coords, moving):
+            scores = real_score(coords, moving)
+            scored.append((coords.copy(), scores))
+            return scores
+
+        real_score = layout.score
+        context = main_parser.Context(0, candidates=32)
+        with unittest.mock.patch.object(layout, 'score', score):
+            main_parser.parse(text, context)
+        points = context.obj_dict['point']
+        self.assertAlmostEqual(points['A'].dist(points['D']), 0.5)
+        # The layout that was kept is the best of the ones that were tried
+        (coords, scores), = scored
+        self.assertEqual(len(scores), 32)
+        best = coords[int(scores.argmax())].tolist()
+        self.assertEqual([[p.x, p.y] for p in points.values()], best)
+
+        # The profile is of the layout that was kept, not the last one
+        solved = []
+
+        def solve(context, *args, **kwargs):
+            real_solve(context, *args, **kwargs)
+            solved.append(context.profile.points)
+
+        real_solve = main_parser._solve
+        context = main_parser.Context(0, candidates=4, profile=True)
+        with unittest.mock.patch.object(main_parser, '_solve', solve), \
+                unittest.mock.patch.object(layout, 'score',
+                                           lambda coords, moving:
+                                           layout.numpy.array([0, 1, 0, 0])):
+            main_parser.parse(text, context)
+        self.assertEqual(len(solved), 4)
+        self.assertIs(context.profile.points, solved[1])
+        self.assertEqual(context.profile.points['D']['branch'],
+                         'arbitrary')
+
+    def test_profile(self):
+        """The profile says how each point was placed, and the graph how the
+        objects depend on each other"""
+        main_parser = youclidbackend.main_parser
+        context = main_parser.Context(0, profile=True)
+        main_parser.parse("[line AB] [circle c center=A radius=1] "
+                          "[point D lieson=c] [point D lieson=AB]\n"
+                          "[loc A x=0 y=0] [loc B x=2 y=0]\n", context)
+        report = context.profile.report()
+        self.assertEqual(report['layouts'], 1)
+        self.assertEqual(report['points']['A']['branch'], 'given')
+        self.assertEqual(report['points']['D']['branch'], 'intersection')
+        self.assertEqual(report['points']['D']['intersections'], 1)
+        json.dumps(report)
+
+        graph = main_parser.constraint_graph(context)
+        self.assertIn('"circle_c" -> "point_D";', graph)
+        self.assertIn('"point_A" -> "line_AB" [style=dashed];', graph)
+        self.assertIn('intersection, 1 found', graph)
+
+    def test_components(self):
+        """Parts of the figure that don't share points are placed the same
+        way on a process pool as they are one after the other"""
+        main_parser = youclidbackend.main_parser
+        text = ("[line AB] [circle c center=A radius=1] [point D lieson=c] "
+                "[point D lieson=AB] [triangle EFG] [line EH] "
+                "[point I lieson=EH] [point J]\n[loc A x=0 y=0]\n")
+        context = main_parser.Context(0)
+        serial = main_parser.parse(text, context)
+        groups = main_parser._components(
+            list(context.obj_dict['point'].values()))
+        self.assertEqual([sorted(p.name for p in g) for g in groups],
+                         [['A', 'B', 'D'], ['E', 'F', 'G', 'H', 'I'], ['J']])
+
+        with unittest.mock.patch.object(main_parser, 'PARALLEL_POINTS', 0):
+            context = main_parser.Context(0, profile=True, jobs=2)
+            parallel = main_parser.parse(text, context)
+            self.assertEqual(serial['geometry'], parallel['geometry'])
+            self.assertEqual(context.profile.points['D']['branch'],
+                             'intersection')
+            self.assertEqual(context.profile.points['A']['branch'], 'given')
+
+            # Both report the same error for a part that can't be placed
+            text = ("[point A] [point C] [circle c center=A radius=AB]\n"
+                    "[point D lieson=c]\n")
+            errors = []
+            for jobs in (1, 2):
+                with self.assertRaises(main_parser.CompileError) as e:
+                    main_parser.parse(text, main_parser.Context(0, jobs=jobs))
+                errors.append(str(e.exception))
+            self.assertEqual(errors[0], errors[1])
+
+    def test_intersection_cache(self):
+        """Compiling the same figure again finds its intersections in the
+        cache, and places the points in the same places"""
+        main_parser = youclidbackend.main_parser
+        cache = youclidbackend.intersections.IntersectionCache()
+        text = ("[line AB] [circle c center=A radius=1] [point D lieson=c] "
+                "[point D lieson=AB]\n[loc A x=0 y=0] [loc B x=2 y=0]\n")
+        first = main_parser.parse(text, main_parser.Context(
+            0, intersections=cache))
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        second = main_parser.parse(text, main_parser.Context(
+            1, intersections=cache))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(first['geometry'], second['geometry'])
+
+    def test_packed_payload(self):
+        """The geometry packed into typed arrays has the same objects and
+        references as the JSON"""
+        main_parser = youclidbackend.main_parser
+        payload = youclidbackend.payload
+        output = main_parser.parse("[line AB] [circle c center=A radius=1] "
+                                   "[step] [triangle ABC]\n"
+                                   "[loc A x=0 y=0] [loc B x=0.5 y=0.25]\n",
+                                   main_parser.Context(0))
+        packed = payload.pack(output)
+
+        def decode(typecode, text):
+            return array.array(typecode, base64.b64decode(text)).tolist()
+
+        names = packed['names']
+        types = [payload.TYPES[t] for t in decode('B', packed['types'])]
+        self.assertEqual(types[:3], ['Point'] * 3)
+        ids = [t.lower() + "_" + n for t, n in zip(types, names)]
+        self.assertEqual(set(ids), set(output['geometry']))
+        self.assertEqual(decode('f', packed['coords'])[:4],
+                         [0.0, 0.0, 0.5, 0.25])
+        offsets, refs = decode('I', packed['offsets']), decode('I',
+                                                               packed['refs'])
+        line = ids.index('line_AB')
+        self.assertEqual([ids[r] for r in refs[offsets[line]:
+                                                 offsets[line + 1]]],
+                         ['point_A', 'point_B'])
+        circle = ids.index('circle_c')
+        self.assertEqual(decode('f', packed['values'])[circle], 1.0)
+        self.assertEqual([[ids[i] for i in step]
+                          for step in packed['animations']],
+                         output['animations'])
+        self.assertIn('"packed":1', main_parser.generate_html(output, True,
+                                                              packed=True))
+
+    def test_generate_html(self):
+        """The template is only read once, and only its own slots are filled
+        in"""
+        main_parser = youclidbackend.main_parser
+        output = main_parser.parse("See draw.js for [point A]\n",
+                                   main_parser.Context(0))
+        main_parser.generate_html(output, True)
+        with unittest.mock.patch('builtins.open') as mock_open:
+            html = main_parser.generate_html(output, False)
+            self.assertFalse(mock_open.called)
+        self.assertIn("See draw.js for", html)
+        self.assertIn(youclidbackend.__path__[0] + "/data/draw.js", html)
+        self.assertNotIn("// insert json here", html)
+
+        written = io.StringIO()
+        main_parser.write_html(written, output, False)
+        self.assertEqual(written.getvalue(), html)
+
+    def test_assets(self):
+        """Final pages refer to hashed assets, which are linked from the
+        store instead of copied again"""
+        main_parser = youclidbackend.main_parser
+        assets = youclidbackend.assets
+        output = main_parser.parse("[point A]\n", main_parser.Context(0))
+        names = assets.names()
+        html = main_parser.generate_html(output, True)
+        self.assertIn('href="%s"' % names['styles/default.css'], html)
+        self.assertIn('data-light="%s"' % names['styles/light.css'], html)
+        self.assertIn('src="%s"' % names['draw.js'], html)
+
+        with tempfile.TemporaryDirectory() as root:
+            store = os.path.join(root, "store")
+            first = os.path.join(root, "first")
+            second = os.path.join(root, "second")
+            self.assertEqual(assets.publish(first, store), names)
+            assets.publish(second, store)
+            for asset, name in names.items():
+                with open(assets.source(asset), 'rb') as f:
+                    content = f.read()
+                with open(os.path.join(second, name), 'rb') as f:
+                    self.assertEqual(f.read(), content)
+                self.assertEqual(
+                    os.stat(os.path.join(first, name)).st_ino,
+                    os.stat(os.path.join(second, name)).st_ino)
+            # Ones that are already there are left alone
+            target = os.path.join(first, names['draw.js'])
+            os.unlink(target)
+            with open(target, 'w') as f:
+                f.write("kept")
+            assets.publish(first, store)
+            with open(target) as f:
+                self.assertEqual(f.read(), "kept")
+
+    def test_distribution(self):
+        """Distribution pages are a single minified file, with compressed
+        copies next to them"""
+        main_parser = youclidbackend.main_parser
+        distribution = youclidbackend.distribution
+        script = ("// A comment\nlet  a = 'b  // c' /* d */ + `e\n  f`\n"
+                  "if (a) {\n    a = a + +1\n}\n")
+        self.assertEqual(distribution.minify_js(script),
+                         "let a='b  // c'+`e\n  f`\nif(a){a=a+ +1}")
+        self.assertEqual(distribution.minify_css(
+            "/* x */\n#a b,\nc {\n  color: red;\n}\n"), "#a b,c{color:red}")
+
+        output = main_parser.parse("[point A]\n", main_parser.Context(0))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "page.html")
+            before, written = main_parser.write_distribution(output, path)
+            self.assertEqual(written[0], (path, os.path.getsize(path)))
+            self.assertIn((path + ".gz", os.path.getsize(path + ".gz")),
+                          written)
+            self.assertLess(written[0][1], before)
+            with open(path, 'rb') as f:
+                html = f.read()
+            with gzip.open(path + ".gz") as f:
+                self.assertEqual(f.read(), html)
+        html = html.decode('utf-8')
+        self.assertNotIn("<script src=", html)
+        self.assertIn('href="data:text/css,', html)
+        self.assertIn('"label":"A"', html)
+
+    def test_build(self):
+        """Directory builds link their pages, and only compile what changed
+        since the last build"""
+        main_parser = youclidbackend.main_parser
+
+        def compiled(results):
+            return sorted(os.path.basename(path) for path, seconds, success
+                          in results if seconds is not None)
+
+        with tempfile.TemporaryDirectory() as root:
+            texts = os.path.join(root, "texts")
+            site = os.path.join(root, "site")
+            # Not the one in the user's cache
+            store = os.path.join(root, "store")
+            os.mkdir(texts)
+            for name in "abc":
+                with open(os.path.join(texts, name + ".yc"), 'w') as f:
+                    f.write("[point %s]\n" % name.upper())
+            context = main_parser.Context(0)
+
+            results = main_parser.build(texts, site, 1, context, store=store)
+            self.assertEqual(compiled(results), ["a.yc", "b.yc", "c.yc"])
+            with open(os.path.join(site, "b.html")) as f:
+                page = f.read()
+            self.assertIn('href="a.html"', page)
+            self.assertIn('href="c.html"', page)
+            with open(os.path.join(site, "index.html")) as f:
+                self.assertIn('href="b.html"', f.read())
+
+            self.assertEqual(
+                compiled(main_parser.build(texts, site, 1, context,
+                                           store=store)), [])
+            with open(os.path.join(texts, "b.yc"), 'a') as f:
+                f.write("[point D]\n")
+            self.assertEqual(
+                compiled(main_parser.build(texts, site, 1, context,
+                                           store=store)),
+                ["b.yc"])
+            # The pages next to a new or removed one change their links
+            with open(os.path.join(texts, "d.yc"), 'w') as f:
+                f.write("[point E]\n")
+            self.assertEqual(
+                compiled(main_parser.build(texts, site, 1, context,
+                                           store=store)),
+                ["c.yc", "d.yc"])
+            os.remove(os.path.join(texts, "a.yc"))
+            self.assertEqual(
+                compiled(main_parser.build(texts, site, 1, context,
+                                           store=store)),
+                ["b.yc"])
+            self.assertFalse(os.path.exists(os.path.join(site, "a.html")))
+            # So does every page when the options do
+            self.assertEqual(
+                compiled(main_parser.build(texts, site, 1, context, True,
+                                           store=store)),
+                ["b.yc", "c.yc", "d.yc"])
+
+            # A file that stops compiling loses its page and its links
+            with open(os.path.join(texts, "c.yc"), 'w') as f:
+                f.write("[circle c center=A radius=AB]\n[point D lieson=c]\n")
+            results = main_parser.build(texts, site, 1, context, True,
+                                        store=store)
+            self.assertEqual(compiled(results), ["b.yc", "c.yc", "d.yc"])
+            self.assertIn(os.path.join(texts, "c.yc"),
+                          [path for path, seconds, success in results
+                           if not success])
+            self.assertFalse(os.path.exists(os.path.join(site, "c.html")))
+            with open(os.path.join(site, "b.html")) as f:
+                self.assertIn('href="d.html"', f.read())
+
+            # index.html is always the list of pages
+            with open(os.path.join(texts, "index.yc"), 'w') as f:
+                f.write("[point A]\n")
+            results = main_parser.build(texts, site, 1, context, True,
+                                        store=store)
+            self.assertIn((os.path.join(texts, "index.yc"), 0.0, False),
+                          results)
+            with open(os.path.join(site, "index.html")) as f:
+                self.assertIn('href="b.html"', f.read())
+
+        # Files that crash the compiler fail on their own
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "a.yc")
+            with open(path, 'w') as f:
+                f.write("[point A]\n")
+            with unittest.mock.patch.object(main_parser, 'parse',
+                                            side_effect=RuntimeError), \
+                    unittest.mock.patch.object(main_parser, 'print_error'):
+                self.assertEqual(main_parser._build_file(path, root)[::2],
+                                 (path, False))
+
+            # Errors say which file they are in, and where
+            with open(path, 'w') as f:
+                f.write("[point A]\n[line B]\n")
+            with unittest.mock.patch.object(main_parser,
+                                            'print_error') as printed:
+                self.assertEqual(main_parser._build_file(path, root)[::2],
+                                 (path, False))
+            out = io.StringIO()
+            main_parser.print_error(*printed.call_args[0], file=out,
+                                    **printed.call_args[1])
+            self.assertTrue(out.getvalue().startswith("%s:2: " % path))
+
+        # Every module goes into the fingerprint of the compiler
+        hashed = []
+        with unittest.mock.patch.object(youclidbackend.manifest,
+                                        '_compiler', None), \
+                unittest.mock.patch.object(youclidbackend.manifest, '_hash',
+                                           lambda path: hashed.append(path)
+                                           or ""):
+            youclidbackend.manifest.compiler()
+        self.assertIn(os.path.join("primitives", "circle.py"),
+                      [os.path.relpath(path, youclidbackend.__path__[0])
+                       for path in hashed])
+
+    def test_errors(self):
+        """Errors are raised, and can all be collected at once"""
+        main_parser = youclidbackend.main_parser
+        text = ("[line AB] [frob X]\n"
+                "[loc A x=foo y=1]\n"
+                "[point C lieson=circle c]\n"
+                "[loc B x=1]\n"
+                "[point D lieson=AB] [point \"E\n")
+        with self.assertRaises(main_parser.CompileError) as cm:
+            main_parser.parse(text)
+        self.assertEqual(cm.exception.name, "Undefined object name")
+        self.assertEqual(cm.exception.lineno, 1)
+
+        with self.assertRaises(main_parser.CompileErrors) as cm:
+            main_parser.parse(text, main_parser.Context(collect_errors=True))
+        self.assertEqual([(e.name, e.lineno) for e in cm.exception.errors],
+                         [("Undefined object name", 1),
+                          ("Not a number", 2),
+                          ("Reference to object before creation", 3),
+                          ("Malformed 'loc' command", 4),
+                          ("No closing quotation", 5)])
+
+    def test_malformed(self):
+        """Declarations that are missing something are compile errors, not
+        crashes"""
+        main_parser = youclidbackend.main_parser
+        cases = [("[]", "Empty declaration"),
+                 ("[point]", "Missing name"),
+                 ("[circle]", "Missing name"),
+                 ("[polygon]", "Missing name"),
+                 ("[loc]", "Missing name"),
+                 ("[line A]", "Name too short"),
+                 ("[angle AB]", "Name too short"),
+                 ("[center D]", "Missing keyword"),
+                 ("[center D circle=c]", "Undefined object circle"),
+                 ("[point A lieson]", "Missing value"),
+                 ("[circle c center]", "Missing value")]
+        for declaration, name in cases:
+            with self.subTest(declaration):
+                with self.assertRaises(main_parser.CompileError) as cm:
+                    main_parser.parse("[line XY]\n%s\n" % declaration)
+                self.assertEqual((cm.exception.name, cm.exception.lineno),
+                                 (name, 2))
+
+        # The points can be given instead of being in the name
+        main_parser.parse("[angle X p1=A p2=B p3=C]\n")
+
+        text = "".join("%s\n" % declaration for declaration, name in cases)
+        with self.assertRaises(main_parser.CompileErrors) as cm:
+            main_parser.parse(text, main_parser.Context(collect_errors=True))
+        self.assertEqual([(e.name, e.lineno) for e in cm.exception.errors],
+                         [(name, i + 1) for i, (d, name) in enumerate(cases)])
+
     def test_intermediate_representation(self):
         """Test that we generate the correct intermediate representation"""
 